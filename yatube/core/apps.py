@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import mail  # noqa: F401
+        from .database import configure_sqlite
+        from .slow_queries import install
+        from .tasks import autodiscover
+        connection_created.connect(
+            configure_sqlite, dispatch_uid='sqlite_pragmas')
+        connection_created.connect(install, dispatch_uid='slow_queries')
+        autodiscover()
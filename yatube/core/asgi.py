@@ -0,0 +1,163 @@
+"""ASGI-приложение поверх обычного WSGI-обработчика Django.
+
+В Django 2.2 нет ни ASGI, ни асинхронных представлений, поэтому
+представления работают как раньше, но в ограниченном пуле потоков
+ASGI_THREADS. Всё ожидание медленного клиента — приём тела запроса и
+отдача ответа — идёт в цикле событий и поток не занимает: поток берётся
+только на время работы представления и базы.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+# Тело запроса больше этого размера уходит из памяти во временный файл.
+SPOOL_SIZE = 1024 * 1024
+SPECIAL_HEADERS = {
+    'content-type': 'CONTENT_TYPE',
+    'content-length': 'CONTENT_LENGTH',
+}
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def environ(scope, body):
+    """WSGI-окружение по ASGI-scope протокола http."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    result = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI хранит путь байтами, упакованными в latin-1.
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').lower()
+        if '_' in name:
+            # X_Forwarded_For совпал бы с проверенным прокси
+            # X-Forwarded-For; серверы такие заголовки отбрасывают.
+            continue
+        value = value.decode('latin-1')
+        key = SPECIAL_HEADERS.get(
+            name, 'HTTP_' + name.upper().replace('-', '_'))
+        if key in result:
+            separator = '; ' if name == 'cookie' else ','
+            value = result[key] + separator + value
+        result[key] = value
+    return result
+
+
+class AsgiHandler:
+    """ASGI 3: обработчик WSGI в пуле потоков, медленные клиенты — в цикле."""
+
+    def __init__(self, application, threads):
+        self.application = application
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип: {scope["type"]}')
+        try:
+            body = await self.read_body(receive)
+        except ClientDisconnected:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            response = await loop.run_in_executor(
+                self.executor, self.respond, environ(scope, body), loop, send)
+        finally:
+            body.close()
+        if response is None:
+            return
+        status, headers, content = response
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': headers})
+        if scope['method'] == 'HEAD':
+            content = b''
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """Дочитывает тело без потока из пула, сколь угодно медленно."""
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                raise ClientDisconnected
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def respond(self, environ, loop, send):
+        """Работает в потоке пула.
+
+        Обычный ответ собирается целиком и отдаётся клиенту уже из цикла.
+        Потоковый читает базу по ходу отдачи, поэтому шлётся прямо отсюда:
+        курсор нельзя передавать между потоками.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers]
+
+        result = self.application(environ, start_response)
+        try:
+            if not getattr(result, 'streaming', False):
+                return (started['status'], started['headers'],
+                        b''.join(result))
+            self.send(loop, send, {'type': 'http.response.start',
+                                   'status': started['status'],
+                                   'headers': started['headers']})
+            head = environ['REQUEST_METHOD'] == 'HEAD'
+            for chunk in result:
+                if chunk and not head:
+                    self.send(loop, send, {'type': 'http.response.body',
+                                           'body': chunk, 'more_body': True})
+            self.send(loop, send, {'type': 'http.response.body'})
+            return None
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    @staticmethod
+    def send(loop, send, message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+
+def get_asgi_application():
+    return AsgiHandler(get_wsgi_application(), settings.ASGI_THREADS)
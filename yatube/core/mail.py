@@ -0,0 +1,229 @@
+"""Исходящая почта через очередь.
+
+EMAIL_BACKEND = OutboxBackend: send_mail и формы Django (сброс пароля)
+только пишут письмо в таблицу, запрос не ждёт почтовый сервер. Задачу
+core.deliver_outbox выполняет воркер: берёт письма пачками по
+OUTBOX_BATCH_SIZE, на каждую пачку открывает одно соединение настоящего
+бэкенда OUTBOX_BACKEND и шлёт не быстрее OUTBOX_RATE писем в секунду —
+в сумме по всем воркерам.
+
+Уведомления ставятся через digest(): письма одного вида одному адресату
+копятся OUTBOX_DIGEST_WINDOW секунд и уходят одним письмом.
+"""
+import json
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import OutboxEmail, RateLimit
+from .tasks import enqueue, retry_delay, task
+
+DELIVER = 'core.deliver_outbox'
+SEPARATOR = '\n\n---\n\n'
+
+logger = logging.getLogger(__name__)
+
+
+def schedule(countdown=0):
+    """Одна ждущая задача на срочные письма и одна — на отложенные.
+
+    Отложенная запускается к самому раннему из запрошенных сроков.
+    """
+    key = 'outbox:later' if countdown else 'outbox'
+    enqueue(DELIVER, countdown=countdown, dedup_key=key)
+
+
+def serialize(message):
+    if message.attachments:
+        raise ValueError('Вложения через очередь писем не отправляются')
+    return OutboxEmail(
+        recipients=json.dumps(message.recipients()),
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email,
+        extra=json.dumps({
+            'to': message.to,
+            'cc': message.cc,
+            'reply_to': message.reply_to,
+            'headers': message.extra_headers,
+            'alternatives': getattr(message, 'alternatives', []),
+        }),
+    )
+
+
+def restore(email):
+    extra = json.loads(email.extra)
+    recipients = json.loads(email.recipients)
+    to, cc = extra.get('to', recipients), extra.get('cc', [])
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=to,
+        cc=cc,
+        # Скрытые копии — всё, что не в to и cc.
+        bcc=[address for address in recipients if address not in to + cc],
+        reply_to=extra.get('reply_to'),
+        headers=extra.get('headers'),
+    )
+    for content, mimetype in extra.get('alternatives', []):
+        message.attach_alternative(content, mimetype)
+    return message
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Бэкенд Django, который откладывает письма в очередь."""
+
+    def send_messages(self, email_messages):
+        emails = [serialize(message) for message in email_messages
+                  if message.recipients()]
+        if not emails:
+            return 0
+        with transaction.atomic():
+            OutboxEmail.objects.bulk_create(emails)
+            schedule()
+        return len(emails)
+
+
+def digest(recipients, key, subject, text):
+    """Ставит уведомление в дайджест key каждому из адресатов."""
+    emails = [OutboxEmail(recipients=json.dumps([recipient]), subject=subject,
+                          body=text, from_email=settings.DEFAULT_FROM_EMAIL,
+                          digest=key)
+              for recipient in recipients]
+    if not emails:
+        return
+    with transaction.atomic():
+        OutboxEmail.objects.bulk_create(emails)
+        schedule(settings.OUTBOX_DIGEST_WINDOW)
+
+
+def coalesce():
+    """Сливает созревшие дайджесты в обычные письма.
+
+    Возвращает число получившихся писем и время, когда созреет
+    следующий дайджест, или None, если ждущих нет.
+    """
+    window = timedelta(seconds=settings.OUTBOX_DIGEST_WINDOW)
+    parts = OutboxEmail.objects.exclude(digest='').filter(failed=False)
+    ripe = parts.filter(created__lte=timezone.now() - window)
+    merged = 0
+    for recipients, key in ripe.order_by().values_list(
+            'recipients', 'digest').distinct():
+        with transaction.atomic():
+            group = list(parts.select_for_update().filter(
+                recipients=recipients, digest=key).order_by('created', 'id'))
+            if not group:
+                continue
+            OutboxEmail.objects.create(
+                recipients=recipients, subject=group[0].subject,
+                body=SEPARATOR.join(part.body for part in group),
+                from_email=group[0].from_email)
+            OutboxEmail.objects.filter(
+                pk__in=[part.pk for part in group]).delete()
+        merged += 1
+    oldest = parts.aggregate(oldest=Min('created'))['oldest']
+    return merged, oldest and oldest + window
+
+
+def claim(limit):
+    """Берёт до limit готовых писем в аренду, как core.tasks.claim."""
+    now = timezone.now()
+    free = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ids = list(OutboxEmail.objects.filter(free, digest='', failed=False)
+               .order_by('id').values_list('id', flat=True)[:limit])
+    lease = now + timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT)
+    OutboxEmail.objects.filter(free, pk__in=ids).update(locked_until=lease)
+    return list(OutboxEmail.objects.filter(pk__in=ids, locked_until=lease))
+
+
+class Throttle:
+    """Не больше rate вызовов wait() в секунду на всех воркерах вместе.
+
+    Слоты раздаёт строка RateLimit: воркер сдвигает next_slot условным
+    UPDATE, как при захвате задачи, и ждёт до своего слота.
+    """
+
+    def __init__(self, rate, name=DELIVER):
+        self.interval = timedelta(seconds=1 / rate) if rate else None
+        self.name = name
+
+    def reserve(self):
+        while True:
+            limit, _ = RateLimit.objects.get_or_create(
+                name=self.name, defaults={'next_slot': timezone.now()})
+            slot = max(limit.next_slot, timezone.now())
+            if RateLimit.objects.filter(
+                    pk=limit.pk, next_slot=limit.next_slot).update(
+                        next_slot=slot + self.interval):
+                return slot
+
+    def wait(self):
+        if self.interval is None:
+            return
+        delay = (self.reserve() - timezone.now()).total_seconds()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def send_batch(emails, throttle):
+    """Одна пачка через одно соединение; возвращает число отправленных."""
+    sent, failed = [], []
+    connection = get_connection(settings.OUTBOX_BACKEND)
+    with connection:
+        for email in emails:
+            throttle.wait()
+            try:
+                connection.send_messages([restore(email)])
+            except Exception:
+                logger.exception('Не удалось отправить письмо %s', email.pk)
+                failed.append((email, traceback.format_exc()))
+            else:
+                sent.append(email.pk)
+    OutboxEmail.objects.filter(pk__in=sent).delete()
+    for email, error in failed:
+        # Аренда до следующей попытки работает как пауза перед повтором.
+        attempts = email.attempts + 1
+        delay = retry_delay(attempts)
+        OutboxEmail.objects.filter(pk=email.pk).update(
+            attempts=attempts, last_error=error,
+            locked_until=timezone.now() + timedelta(seconds=delay),
+            failed=attempts >= settings.OUTBOX_MAX_ATTEMPTS)
+        schedule(delay)
+    return len(sent)
+
+
+def deliver(budget=None):
+    """Шлёт письма пачками, пока они есть или не кончилось время.
+
+    Возвращает число отправленных. Если письма остались, ставит себя
+    снова: задача не должна пережить свою аренду.
+    """
+    budget = budget or settings.TASK_VISIBILITY_TIMEOUT / 2
+    deadline = time.monotonic() + budget
+    _, ripens = coalesce()
+    throttle = Throttle(settings.OUTBOX_RATE)
+    total = 0
+    while time.monotonic() < deadline:
+        emails = claim(settings.OUTBOX_BATCH_SIZE)
+        if not emails:
+            break
+        total += send_batch(emails, throttle)
+    else:
+        schedule()
+    if ripens is not None:
+        schedule(max((ripens - timezone.now()).total_seconds(), 0) + 1)
+    return total
+
+
+@task(DELIVER)
+def deliver_outbox():
+    deliver()
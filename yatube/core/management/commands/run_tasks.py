@@ -0,0 +1,56 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import tasks
+
+
+def serve(threads, poll_interval):
+    """Воркеры процесса; SIGTERM даёт дорешать начатые задачи."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    tasks.serve(threads, poll_interval, stop)
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в базе'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=settings.TASK_PROCESSES)
+        parser.add_argument('--threads', type=int,
+                            default=settings.TASK_THREADS,
+                            help='Потоков в каждом процессе')
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.TASK_POLL_INTERVAL,
+                            help='Секунд ожидания, когда задач нет')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count = tasks.run_pending()
+            self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {count}'))
+            return
+        arguments = (options['threads'], options['poll_interval'])
+        if options['processes'] == 1:
+            return serve(*arguments)
+        # Открытые соединения не должны достаться дочерним процессам.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [context.Process(target=serve, args=arguments)
+                    for _ in range(options['processes'])]
+        for child in children:
+            child.start()
+        signal.signal(signal.SIGTERM, lambda *args: [
+            child.terminate() for child in children])
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.join()
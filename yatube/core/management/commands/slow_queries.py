@@ -0,0 +1,38 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import slow_queries
+
+
+class Command(BaseCommand):
+    help = 'Сводка журнала медленных запросов по отпечаткам SQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG)
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--clear', action='store_true',
+                            help='Очистить журнал после отчёта')
+
+    def handle(self, *args, **options):
+        groups = slow_queries.report(slow_queries.read(options['log']))
+        if not groups:
+            self.stdout.write('Медленных запросов нет')
+        for group in groups[:options['top']]:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{group["fingerprint"]}: {group["count"]} раз, '
+                f'всего {group["total_ms"]:.1f} мс, '
+                f'максимум {group["max_ms"]:.1f} мс'))
+            self.stdout.write(f'  {group["sql"]}')
+            for title, field in (('Код', 'origins'), ('Шаблон', 'templates')):
+                for place, count in sorted(
+                        group[field].items(), key=lambda item: -item[1])[:3]:
+                    self.stdout.write(f'  {title}: {place} ({count})')
+            warnings = slow_queries.suspicious(group['plan'])
+            for line in group['plan'] or ():
+                style = (self.style.WARNING if line in warnings
+                         else str)
+                self.stdout.write(style(f'  План: {line}'))
+        if options['clear'] and os.path.exists(options['log']):
+            os.remove(options['log'])
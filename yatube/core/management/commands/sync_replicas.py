@@ -0,0 +1,26 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную SQLite-базу в файлы реплик из DB_REPLICAS, '
+            'чтобы проверить чтение с реплик локально')
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Реплики обновляет сама СУБД, а не команда')
+        if not settings.REPLICAS:
+            raise CommandError('Реплики не настроены: задайте DB_REPLICAS')
+        primary.ensure_connection()
+        for alias in settings.REPLICAS:
+            connections[alias].close()
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f'{alias}: обновлена'))
@@ -0,0 +1,228 @@
+"""Счётчики производительности запросов в формате Prometheus.
+
+Гистограммы кумулятивные, как принято в Prometheus: окно и скорость
+считает сервер метрик через rate(). Данные живут в памяти процесса,
+поэтому каждый воркер отдаёт свои.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.template.base import Template
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        'Время обработки запроса', SECONDS_BUCKETS),
+    'db_queries': ('Запросов к базе за запрос', QUERIES_BUCKETS),
+    'db_duration_seconds': ('Время в базе за запрос', SECONDS_BUCKETS),
+    'template_duration_seconds': (
+        'Время рендера шаблонов за запрос', SECONDS_BUCKETS),
+}
+COUNTERS = {
+    'cache_hits_total': 'Попаданий в кеш',
+    'cache_misses_total': 'Промахов кеша',
+}
+CACHE_RESULTS = 'cache_results_total'
+PREFIX = 'yatube_'
+
+_local = threading.local()
+_missing = object()
+
+
+class RequestTimings:
+    """Всё, что набралось за один запрос."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def current():
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def collecting():
+    timings = RequestTimings()
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = None
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper."""
+    timings = current()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - started
+        timings.queries += 1
+
+
+def _timed_render(render):
+    def wrapper(self, context):
+        timings = current()
+        if timings is None:
+            return render(self, context)
+        # Вложенные {% include %} уже учтены внешним шаблоном.
+        timings.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:
+                timings.template += time.perf_counter() - started
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get(get):
+    def wrapper(self, key, default=None, version=None):
+        value = get(self, key, _missing, version)
+        timings = current()
+        if value is _missing:
+            if timings is not None:
+                timings.cache_misses += 1
+            return default
+        if timings is not None:
+            timings.cache_hits += 1
+        return value
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        keys = list(keys)
+        found = get_many(self, keys, version=version)
+        timings = current()
+        if timings is not None:
+            timings.cache_hits += len(found)
+            timings.cache_misses += len(keys) - len(found)
+        return found
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument(cache_aliases):
+    """Один раз оборачивает рендер шаблонов и чтения из кешей."""
+    if not getattr(Template.render, 'instrumented', False):
+        Template.render = _timed_render(Template.render)
+    for alias in cache_aliases:
+        backend = type(caches[alias])
+        if not getattr(backend.get, 'instrumented', False):
+            backend.get = _counted_get(backend.get)
+        # Базовый get_many сам зовёт get, второй раз считать не нужно.
+        if backend.get_many is BaseCache.get_many:
+            continue
+        if not getattr(backend.get_many, 'instrumented', False):
+            backend.get_many = _counted_get_many(backend.get_many)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Гистограммы и счётчики по именам представлений."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.counters = {name: {} for name in COUNTERS}
+        self.cache_results = {}
+
+    def record(self, view, duration, timings):
+        values = {
+            'request_duration_seconds': duration,
+            'db_queries': timings.queries,
+            'db_duration_seconds': timings.db,
+            'template_duration_seconds': timings.template,
+        }
+        with self.lock:
+            for name, value in values.items():
+                series = self.histograms[name]
+                if view not in series:
+                    series[view] = Histogram(HISTOGRAMS[name][1])
+                series[view].observe(value)
+            for name, value in (('cache_hits_total', timings.cache_hits),
+                                ('cache_misses_total',
+                                 timings.cache_misses)):
+                series = self.counters[name]
+                series[view] = series.get(view, 0) + value
+
+    def count_cache(self, family, result):
+        """Исход чтения защищённого ключа: hit, miss, early или stale."""
+        with self.lock:
+            key = (family, result)
+            self.cache_results[key] = self.cache_results.get(key, 0) + 1
+
+    def render(self):
+        """Текст в формате экспозиции Prometheus 0.0.4."""
+        lines = []
+        with self.lock:
+            for name, (help_text, buckets) in HISTOGRAMS.items():
+                metric = PREFIX + name
+                lines += [f'# HELP {metric} {help_text}',
+                          f'# TYPE {metric} histogram']
+                for view, histogram in sorted(self.histograms[name].items()):
+                    label = f'view="{escape(view)}"'
+                    total = 0
+                    for bound, count in zip(
+                            buckets + ('+Inf',), histogram.counts):
+                        total += count
+                        lines.append(
+                            f'{metric}_bucket{{{label},le="{bound}"}} '
+                            f'{total}')
+                    lines.append(f'{metric}_sum{{{label}}} {histogram.sum}')
+                    lines.append(
+                        f'{metric}_count{{{label}}} {histogram.count}')
+            for name, help_text in COUNTERS.items():
+                metric = PREFIX + name
+                lines += [f'# HELP {metric} {help_text}',
+                          f'# TYPE {metric} counter']
+                for view, value in sorted(self.counters[name].items()):
+                    lines.append(f'{metric}{{view="{escape(view)}"}} {value}')
+            metric = PREFIX + CACHE_RESULTS
+            lines += [f'# HELP {metric} Исходы чтения ключей с защитой '
+                      f'от лавины',
+                      f'# TYPE {metric} counter']
+            for (family, result), value in sorted(
+                    self.cache_results.items()):
+                lines.append(f'{metric}{{family="{escape(family)}",'
+                             f'result="{result}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+registry = Registry()
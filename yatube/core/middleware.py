@@ -0,0 +1,42 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+class PerformanceMiddleware:
+    """Меряет каждый запрос и добавляет заголовок Server-Timing.
+
+    Стоит первым в MIDDLEWARE, чтобы учесть работу остальных.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.instrument(settings.CACHES)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with metrics.collecting() as timings, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.record_query))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        metrics.registry.record(view, duration, timings)
+        response['Server-Timing'] = server_timing(duration, timings)
+        return response
+
+
+def server_timing(duration, timings):
+    return ', '.join((
+        f'app;dur={duration * 1000:.1f}',
+        f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"',
+        f'tpl;dur={timings.template * 1000:.1f}',
+        f'cache;desc="{timings.cache_hits} hits, '
+        f'{timings.cache_misses} misses"',
+    ))
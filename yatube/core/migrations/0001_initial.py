@@ -0,0 +1,37 @@
+# Generated by Django 2.2.26 on 2026-10-18 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Задача')),
+                ('arguments', models.TextField(default='[]', verbose_name='Аргументы')),
+                ('dedup_key', models.CharField(blank=True, help_text='Пока задача ждёт, вторая с тем же ключом не ставится', max_length=200, null=True, unique=True, verbose_name='Ключ дедупликации')),
+                ('run_at', models.DateTimeField(verbose_name='Выполнить после')),
+                ('locked_until', models.DateTimeField(blank=True, help_text='Если воркер не успел к этому времени, задачу берёт другой', null=True, verbose_name='Занята до')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('failed', models.BooleanField(default=False, help_text='Попытки кончились, задача больше не запускается', verbose_name='Провалена')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Поставлена')),
+            ],
+            options={
+                'verbose_name': 'Задача',
+                'verbose_name_plural': 'Задачи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['failed', 'run_at'], name='task_failed_run_at'),
+        ),
+    ]
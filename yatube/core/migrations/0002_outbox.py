@@ -0,0 +1,38 @@
+# Generated by Django 2.2.26 on 2026-10-18 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipients', models.TextField(verbose_name='Получатели')),
+                ('subject', models.TextField(verbose_name='Тема')),
+                ('body', models.TextField(verbose_name='Текст')),
+                ('from_email', models.CharField(max_length=254, verbose_name='Отправитель')),
+                ('extra', models.TextField(default='{}', help_text='JSON: копии, заголовки, альтернативные версии', verbose_name='Прочее')),
+                ('digest', models.CharField(blank=True, help_text='Письма одного дайджеста одному адресату сливаются в одно', max_length=100, verbose_name='Дайджест')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Отправляется до')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('failed', models.BooleanField(default=False, verbose_name='Не доставлено')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Поставлено')),
+            ],
+            options={
+                'verbose_name': 'Письмо',
+                'verbose_name_plural': 'Исходящие письма',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxemail',
+            index=models.Index(fields=['digest', 'failed', 'created'], name='outbox_digest_failed_created'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.26 on 2026-10-18 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Название')),
+                ('next_slot', models.DateTimeField(verbose_name='Следующий слот')),
+            ],
+            options={
+                'verbose_name': 'Ограничение темпа',
+                'verbose_name_plural': 'Ограничения темпа',
+            },
+        ),
+    ]
@@ -10,3 +10,114 @@ class CreateModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class Task(models.Model):
+    """Отложенный вызов функции из реестра core.tasks."""
+    name = models.CharField(max_length=200, verbose_name='Задача')
+    arguments = models.TextField(default='[]', verbose_name='Аргументы')
+    dedup_key = models.CharField(
+        max_length=200,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name='Ключ дедупликации',
+        help_text='Пока задача ждёт, вторая с тем же ключом не ставится'
+    )
+    run_at = models.DateTimeField(verbose_name='Выполнить после')
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Занята до',
+        help_text='Если воркер не успел к этому времени, задачу берёт другой'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    failed = models.BooleanField(
+        default=False,
+        verbose_name='Провалена',
+        help_text='Попытки кончились, задача больше не запускается'
+    )
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Поставлена'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['failed', 'run_at'],
+                         name='task_failed_run_at'),
+        ]
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+
+    def __str__(self):
+        return f'{self.name}, attempts: {self.attempts}'
+
+
+class OutboxEmail(models.Model):
+    """Письмо, ждущее отправки через core.mail."""
+    recipients = models.TextField(verbose_name='Получатели')
+    subject = models.TextField(verbose_name='Тема')
+    body = models.TextField(verbose_name='Текст')
+    from_email = models.CharField(
+        max_length=254,
+        verbose_name='Отправитель'
+    )
+    extra = models.TextField(
+        default='{}',
+        verbose_name='Прочее',
+        help_text='JSON: копии, заголовки, альтернативные версии'
+    )
+    digest = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Дайджест',
+        help_text='Письма одного дайджеста одному адресату сливаются в одно'
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Отправляется до'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    failed = models.BooleanField(default=False, verbose_name='Не доставлено')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Поставлено'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['digest', 'failed', 'created'],
+                         name='outbox_digest_failed_created'),
+        ]
+        verbose_name = 'Письмо'
+        verbose_name_plural = 'Исходящие письма'
+
+    def __str__(self):
+        return f'{self.subject}, to: {self.recipients}'
+
+
+class RateLimit(models.Model):
+    """Общий для всех воркеров темп: время ближайшего свободного слота."""
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Название'
+    )
+    next_slot = models.DateTimeField(verbose_name='Следующий слот')
+
+    class Meta:
+        verbose_name = 'Ограничение темпа'
+        verbose_name_plural = 'Ограничения темпа'
+
+    def __str__(self):
+        return f'{self.name}, next: {self.next_slot}'
@@ -0,0 +1,77 @@
+"""Чтение с реплик для страниц, которые только читают.
+
+Представления с read_from_replica читают модели из REPLICA_APPS с
+реплик, всё остальное идёт в default. После записи pin_to_primary
+ставит cookie, и на REPLICA_PIN_SECONDS пользователь читает только с
+основной базы — так он сразу видит свой пост, комментарий или подписку.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+PIN_COOKIE = 'pin_primary'
+PRIMARY = 'default'
+
+_local = threading.local()
+
+
+def replica_allowed():
+    return getattr(_local, 'replica', False)
+
+
+@contextmanager
+def replica_reads(allowed=True):
+    previous = replica_allowed()
+    _local.replica = allowed
+    try:
+        yield
+    finally:
+        _local.replica = previous
+
+
+def read_from_replica(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(PIN_COOKIE not in request.COOKIES):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def pin_to_primary(view):
+    """Закрепляет за основной базой после успешной записи.
+
+    Успех — редирект: так все пишущие представления отвечают на
+    принятую форму, а на GET и ошибки в форме отдают страницу.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if (settings.REPLICAS and request.user.is_authenticated
+                and response.status_code == 302):
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if (settings.REPLICAS and replica_allowed()
+                and model._meta.app_label in settings.REPLICA_APPS):
+            return random.choice(settings.REPLICAS)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Схема реплик приходит с основной базы, не из миграций."""
+        return db == PRIMARY
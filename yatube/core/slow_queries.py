@@ -0,0 +1,185 @@
+"""Журнал медленных запросов к базе с планами выполнения.
+
+Обёртка вешается на каждое новое соединение. Запросы дольше
+SLOW_QUERY_MS пишутся строками JSON в SLOW_QUERY_LOG вместе с местом
+вызова в коде проекта, шаблоном и планом. Команда slow_queries
+группирует их по отпечатку SQL.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.template.base import Node, Template
+from django.utils import timezone
+
+from . import metrics, middleware
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDERS = re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)')
+SPACES = re.compile(r'\s+')
+ORIGIN_DEPTH = 3
+
+_local = threading.local()
+_lock = threading.Lock()
+_explained = set()
+
+INSTRUMENTATION = {
+    os.path.splitext(module.__file__)[0] + '.py'
+    for module in (metrics, middleware, sys.modules[__name__])
+}
+
+
+def normalize(sql):
+    """SQL без литералов и с одинаковыми списками IN (...)."""
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = PLACEHOLDERS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def origin():
+    """Ближайшие строки кода проекта и шаблон, откуда пришёл запрос."""
+    code, template = [], None
+    frame = sys._getframe(2)
+    while frame is not None and (len(code) < ORIGIN_DEPTH or not template):
+        filename = frame.f_code.co_filename
+        if (len(code) < ORIGIN_DEPTH
+                and filename.startswith(settings.BASE_DIR)
+                and 'site-packages' not in filename
+                and filename not in INSTRUMENTATION):
+            relative = os.path.relpath(filename, settings.BASE_DIR)
+            code.append(
+                f'{relative}:{frame.f_lineno} {frame.f_code.co_name}')
+        # type(), а не isinstance: self бывает ленивым объектом, и
+        # isinstance вычислил бы его прямо посреди запроса.
+        owner = frame.f_locals.get('self')
+        if template is None and issubclass(type(owner), (Node, Template)):
+            template = getattr(owner.origin, 'template_name', None)
+        frame = frame.f_back
+    return ' < '.join(code) or None, template
+
+
+def explain(connection, sql, params):
+    """План запроса; только для SELECT и только раз на отпечаток."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+              else 'EXPLAIN ')
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            # В SQLite текст шага плана — последняя колонка.
+            return [str(row[-1]) for row in cursor.fetchall()]
+    except Exception as error:
+        return [f'EXPLAIN не удался: {error}']
+    finally:
+        _local.explaining = False
+
+
+def write(entry):
+    line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+    with _lock, open(settings.SLOW_QUERY_LOG, 'a',
+                     encoding='utf-8') as stream:
+        stream.write(line)
+
+
+class SlowQueryWrapper:
+    """Обёртка для connection.execute_wrappers."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold = settings.SLOW_QUERY_MS
+        if threshold is None or getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        succeeded = False
+        try:
+            result = execute(sql, params, many, context)
+            succeeded = True
+            return result
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= threshold:
+                self.record(sql, params, many, duration, succeeded)
+
+    def record(self, sql, params, many, duration, succeeded=True):
+        key = fingerprint(sql)
+        code, template = origin()
+        plan = None
+        # После ошибки транзакция PostgreSQL прервана: EXPLAIN в ней
+        # упадёт и заменит исходное исключение.
+        if succeeded and not many and key not in _explained:
+            _explained.add(key)
+            plan = explain(self.connection, sql, params)
+        write({
+            'time': timezone.now().isoformat(),
+            'fingerprint': key,
+            'sql': normalize(sql),
+            'duration_ms': round(duration, 2),
+            'alias': self.connection.alias,
+            'origin': code,
+            'template': template,
+            'plan': plan,
+        })
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    connection.execute_wrappers.append(SlowQueryWrapper(connection))
+
+
+def read(path):
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def report(entries):
+    """Сводка по отпечаткам, самые дорогие в сумме — первыми."""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'sql': entry['sql'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'origins': {},
+            'templates': {},
+            'plan': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        for field, key in (('origins', 'origin'), ('templates', 'template')):
+            if entry.get(key):
+                group[field][entry[key]] = group[field].get(entry[key], 0) + 1
+        group['plan'] = entry.get('plan') or group['plan']
+    return sorted(groups.values(), key=lambda group: -group['total_ms'])
+
+
+def suspicious(plan):
+    """Строки плана SQLite, намекающие на недостающий индекс.
+
+    Это полный проход таблицы и сортировка во временном B-дереве.
+    """
+    return [line for line in plan or ()
+            if 'TEMP B-TREE' in line
+            or (re.search(r'\bSCAN\b', line) and 'USING' not in line)]
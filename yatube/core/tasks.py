@@ -0,0 +1,159 @@
+"""Очередь фоновых задач в базе проекта.
+
+enqueue пишет строку Task в текущей транзакции: задача появится у
+воркера только вместе с данными, ради которых её поставили. Воркер
+(команда run_tasks) забирает задачу условным UPDATE и держит её
+TASK_VISIBILITY_TIMEOUT секунд; если он умер, задачу возьмёт другой.
+Поэтому задачи должны быть идемпотентными. Своей транзакции у задачи
+нет: в SQLite она спорила бы с другими воркерами за блокировку записи
+посреди чтения. Упавшая задача повторяется с растущей паузой, после
+TASK_MAX_ATTEMPTS попыток помечается failed.
+"""
+import json
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+
+def task(name):
+    """Регистрирует функцию как задачу с именем name."""
+    def decorator(func):
+        REGISTRY[name] = func
+        return func
+    return decorator
+
+
+def autodiscover():
+    """Импортирует модули tasks всех приложений, заполняя реестр."""
+    autodiscover_modules('tasks')
+
+
+def enqueue(name, *args, dedup_key=None, countdown=0):
+    """Ставит задачу; с dedup_key — только если такой ещё нет в ожидании.
+
+    Ждущая задача с тем же ключом выполнится не позже новой: её срок
+    сдвигается на более ранний.
+    """
+    if name not in REGISTRY:
+        raise KeyError(f'Нет задачи {name}')
+    run_at = timezone.now() + timedelta(seconds=countdown)
+    Task.objects.bulk_create([Task(
+        name=name,
+        arguments=json.dumps(args),
+        dedup_key=dedup_key,
+        run_at=run_at,
+    )], ignore_conflicts=dedup_key is not None)
+    if dedup_key is not None:
+        Task.objects.filter(dedup_key=dedup_key, run_at__gt=run_at).update(
+            run_at=run_at)
+
+
+def due():
+    now = timezone.now()
+    return Task.objects.filter(failed=False, run_at__lte=now).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+
+
+def claim():
+    """Забирает одну готовую задачу; возвращает (id, срок аренды) или None.
+
+    Аренда — новое значение locked_until: UPDATE с условием на старое
+    проходит только у одного воркера, и тем же значением воркер потом
+    доказывает, что задача всё ещё его.
+    """
+    for pk, locked_until in due().order_by('run_at', 'id').values_list(
+            'pk', 'locked_until')[:10]:
+        lease = timezone.now() + timedelta(
+            seconds=settings.TASK_VISIBILITY_TIMEOUT)
+        # Взятая задача ключ отдаёт: новую с тем же ключом можно ставить,
+        # ведь эта могла уже прочитать старые данные.
+        if Task.objects.filter(pk=pk, locked_until=locked_until).update(
+                locked_until=lease, attempts=F('attempts') + 1,
+                dedup_key=None):
+            return pk, lease
+    return None
+
+
+def retry_delay(attempts):
+    return settings.TASK_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def execute(pk, lease):
+    """Выполняет взятую задачу; True, если она прошла."""
+    row = Task.objects.get(pk=pk)
+    mine = Task.objects.filter(pk=pk, locked_until=lease)
+    try:
+        REGISTRY[row.name](*json.loads(row.arguments))
+    except Exception:
+        logger.exception('Задача %s (%s) упала', row.name, pk)
+        error = traceback.format_exc()
+        if row.name not in REGISTRY or row.attempts >= (
+                settings.TASK_MAX_ATTEMPTS):
+            mine.update(failed=True, locked_until=None, last_error=error)
+        else:
+            mine.update(
+                locked_until=None, last_error=error,
+                run_at=timezone.now() + timedelta(
+                    seconds=retry_delay(row.attempts)))
+        return False
+    mine.delete()
+    return True
+
+
+def run_pending():
+    """Выполняет в текущем потоке все готовые задачи; возвращает их число."""
+    count = 0
+    while True:
+        claimed = claim()
+        if claimed is None:
+            return count
+        execute(*claimed)
+        count += 1
+
+
+def work(stop, poll_interval):
+    """Цикл воркера-потока: задача за задачей, без задач — ждёт."""
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            claimed = claim()
+            if claimed is not None:
+                execute(*claimed)
+                continue
+        except Exception:
+            logger.exception('Сбой воркера очереди задач')
+        stop.wait(poll_interval)
+    close_old_connections()
+
+
+def serve(threads, poll_interval, stop=None):
+    """Запускает threads воркеров и ждёт, пока stop не будет выставлен."""
+    stop = stop or threading.Event()
+    workers = [
+        threading.Thread(target=work, args=(stop, poll_interval),
+                         name=f'tasks-{number}', daemon=True)
+        for number in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(timeout=poll_interval)
+    except KeyboardInterrupt:
+        stop.set()
+        for worker in workers:
+            worker.join()
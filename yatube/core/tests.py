@@ -1,4 +1,43 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import send_mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.core.wsgi import get_wsgi_application
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from core import mail as outbox, metrics, routers, slow_queries, tasks
+from core.asgi import AsgiHandler, environ
+from core.models import OutboxEmail, Task
+from posts.models import Post
+
+METRICS_TOKEN = 'scrape-token'
+SLOW_QUERY_LOG = os.path.join(tempfile.mkdtemp(), 'slow.log')
+CALLS = []
+OPENED = []
+
+
+@tasks.task('core.tests.record')
+def record(value):
+    CALLS.append(value)
+
+
+@tasks.task('core.tests.explode')
+def explode():
+    raise ValueError('boom')
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +45,358 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        metrics.instrument(['default'])
+        cache.clear()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for part in ('app;dur=', 'db;dur=', 'tpl;dur=', 'cache;desc='):
+            self.assertIn(part, timing)
+        self.assertRegex(timing, r'desc="\d+ queries"')
+
+    def test_cache_hits_and_misses_are_counted(self):
+        with metrics.collecting() as timings:
+            cache.get('missing')
+            cache.set('present', 1)
+            cache.get('present')
+        self.assertEqual((timings.cache_hits, timings.cache_misses), (1, 1))
+
+    @override_settings(METRICS_TOKEN=METRICS_TOKEN)
+    def test_metrics_endpoint_exposes_histograms(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION=f'Bearer {METRICS_TOKEN}')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      text)
+        self.assertIn(
+            'yatube_db_queries_bucket{view="posts:index",le="+Inf"}', text)
+        self.assertIn('yatube_cache_misses_total{view="posts:index"}', text)
+
+    @override_settings(METRICS_TOKEN=METRICS_TOKEN)
+    def test_metrics_endpoint_needs_staff_or_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        user = get_user_model().objects.create_user(username='reader')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_metrics_endpoint_is_closed_without_token_setting(self):
+        self.assertEqual(self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code,
+            404)
+
+
+@override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_LOG=SLOW_QUERY_LOG)
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        slow_queries._explained.clear()
+
+    def tearDown(self):
+        if os.path.exists(SLOW_QUERY_LOG):
+            os.remove(SLOW_QUERY_LOG)
+
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            slow_queries.fingerprint(
+                "SELECT * FROM t WHERE id IN (%s, %s) AND name = 'a'"),
+            slow_queries.fingerprint(
+                "SELECT * FROM t WHERE id IN (%s) AND name = 'bb'"))
+
+    def test_queries_are_logged_with_origin_and_plan(self):
+        self.client.get(reverse('posts:profile', args=['nobody']))
+        entries = list(slow_queries.read(SLOW_QUERY_LOG))
+        self.assertTrue(entries)
+        self.assertTrue(any(
+            entry['origin'] and entry['origin'].startswith('posts/views.py')
+            for entry in entries))
+        self.assertTrue(any(entry['plan'] for entry in entries))
+
+    def test_failed_query_is_logged_without_explain(self):
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT * FROM missing_table')
+        entries = [entry for entry in slow_queries.read(SLOW_QUERY_LOG)
+                   if 'missing_table' in entry['sql']]
+        self.assertEqual(len(entries), 1)
+        self.assertIsNone(entries[0]['plan'])
+
+    def test_report_command_groups_by_fingerprint(self):
+        for name in ('first', 'second'):
+            get_user_model().objects.filter(username=name).exists()
+        output = StringIO()
+        call_command('slow_queries', stdout=output, clear=True)
+        self.assertIn('2 раз', output.getvalue())
+        self.assertIn('План:', output.getvalue())
+        self.assertFalse(os.path.exists(SLOW_QUERY_LOG))
+
+
+class SQLitePragmaTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_hook_applies_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Прагмы есть только у SQLite')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64000)
+
+
+@override_settings(REPLICAS=['replica1'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_go_to_replica_only_inside_read_views(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        with routers.replica_reads():
+            self.assertEqual(self.router.db_for_read(Post), 'replica1')
+            self.assertEqual(
+                self.router.db_for_read(get_user_model()), 'default')
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_pin_cookie_keeps_reads_on_primary(self):
+        seen = []
+
+        @routers.read_from_replica
+        def view(request):
+            seen.append(self.router.db_for_read(Post))
+
+        factory = RequestFactory()
+        view(factory.get('/'))
+        request = factory.get('/')
+        request.COOKIES[routers.PIN_COOKIE] = '1'
+        view(request)
+        self.assertEqual(seen, ['replica1', 'default'])
+
+    def test_write_views_pin_user_to_primary(self):
+        user = get_user_model().objects.create_user(username='writer')
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Текст'})
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:post_create'))
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+
+class AsgiHandlerTests(TransactionTestCase):
+    """Представления идут в потоках пула, поэтому данные коммитятся."""
+
+    def setUp(self):
+        cache.clear()
+        self.handler = AsgiHandler(get_wsgi_application(), threads=2)
+        self.author = get_user_model().objects.create_user(username='asgi')
+        Post.objects.create(text='Пост через ASGI', author=self.author)
+
+    def tearDown(self):
+        self.handler.executor.shutdown()
+
+    def call(self, scope, chunks=(b'',)):
+        scope = {'type': 'http', 'method': 'GET', 'root_path': '',
+                 'query_string': b'', 'headers': [(b'host', b'localhost')],
+                 **scope}
+        incoming = [{'type': 'http.request', 'body': chunk,
+                     'more_body': number < len(chunks) - 1}
+                    for number, chunk in enumerate(chunks)]
+        messages = []
+
+        async def receive():
+            return incoming.pop(0)
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(self.handler(scope, receive, send))
+        return messages
+
+    def test_page_is_rendered_in_pool(self):
+        start, body = self.call({'path': reverse('posts:index')})
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/html; charset=utf-8'),
+                      start['headers'])
+        self.assertIn('Пост через ASGI', body['body'].decode())
+
+    def test_streaming_response_is_sent_in_chunks(self):
+        messages = self.call({'path': reverse('api_v1:export')})
+        self.assertEqual(messages[0]['status'], 200)
+        rows = [json.loads(message['body']) for message in messages[1:-1]]
+        self.assertEqual([row['text'] for row in rows], ['Пост через ASGI'])
+        self.assertFalse(messages[-1].get('more_body', False))
+
+    def test_head_has_no_body(self):
+        start, body = self.call(
+            {'path': reverse('posts:index'), 'method': 'HEAD'})
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(body['body'], b'')
+
+    def test_body_and_headers_reach_wsgi_environ(self):
+        async def read():
+            chunks = [{'type': 'http.request', 'body': b'a=1&',
+                       'more_body': True},
+                      {'type': 'http.request', 'body': b'b=2'}]
+
+            async def receive():
+                return chunks.pop(0)
+            return await self.handler.read_body(receive)
+
+        body = asyncio.run(read())
+        result = environ({
+            'method': 'POST', 'path': '/путь/', 'query_string': b'q=1',
+            'headers': [(b'content-type', b'text/plain'),
+                        (b'cookie', b'a=1'), (b'cookie', b'b=2'),
+                        (b'x-forwarded-for', b'10.0.0.1'),
+                        (b'x_forwarded_for', b'6.6.6.6')],
+        }, body)
+        self.assertEqual(result['wsgi.input'].read(), b'a=1&b=2')
+        self.assertEqual(result['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(result['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(result['HTTP_X_FORWARDED_FOR'], '10.0.0.1')
+        self.assertEqual(result['PATH_INFO'].encode('latin-1').decode(),
+                         '/путь/')
+        self.assertEqual(result['QUERY_STRING'], 'q=1')
+
+
+@override_settings(TASK_MAX_ATTEMPTS=2, TASK_RETRY_DELAY=10)
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_tasks_run_once_and_are_deduplicated_while_waiting(self):
+        for _ in range(2):
+            tasks.enqueue('core.tests.record', 1, dedup_key='one')
+        tasks.enqueue('core.tests.record', 2)
+        self.assertEqual(tasks.run_pending(), 2)
+        self.assertEqual(sorted(CALLS), [1, 2])
+        self.assertFalse(Task.objects.exists())
+
+    def test_claimed_task_frees_its_dedup_key(self):
+        tasks.enqueue('core.tests.record', 1, dedup_key='one')
+        pk, lease = tasks.claim()
+        tasks.enqueue('core.tests.record', 1, dedup_key='one')
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_failures_are_retried_with_backoff_then_marked(self):
+        tasks.enqueue('core.tests.explode')
+        self.assertFalse(tasks.execute(*tasks.claim()))
+        task = Task.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertIn('boom', task.last_error)
+        self.assertGreater(task.run_at, timezone.now() + timedelta(seconds=9))
+        self.assertIsNone(tasks.claim())
+        Task.objects.update(run_at=timezone.now())
+        tasks.execute(*tasks.claim())
+        task.refresh_from_db()
+        self.assertTrue(task.failed)
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_expired_lease_is_taken_over(self):
+        tasks.enqueue('core.tests.record', 1)
+        pk, stale = tasks.claim()
+        self.assertIsNone(tasks.claim())
+        Task.objects.update(locked_until=timezone.now())
+        _, lease = tasks.claim()
+        tasks.execute(pk, stale)
+        self.assertTrue(Task.objects.filter(pk=pk).exists())
+        tasks.execute(pk, lease)
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(CALLS, [1, 1])
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(KeyError):
+            tasks.enqueue('core.tests.missing')
+
+    def test_command_runs_pending_tasks(self):
+        tasks.enqueue('core.tests.record', 3)
+        out = StringIO()
+        call_command('run_tasks', '--once', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(CALLS, [3])
+
+
+class CountingBackend(EmailBackend):
+
+    def open(self):
+        OPENED.append(self)
+        return True
+
+    def send_messages(self, messages):
+        if any('bad@' in message.to[0] for message in messages):
+            raise OSError('отказ сервера')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='core.mail.OutboxBackend',
+                   OUTBOX_BACKEND='core.tests.CountingBackend',
+                   OUTBOX_BATCH_SIZE=2, OUTBOX_RATE=0, OUTBOX_MAX_ATTEMPTS=2)
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        OPENED.clear()
+
+    def test_send_mail_is_queued_and_delivered_in_batches(self):
+        for number in range(5):
+            send_mail(f'Тема {number}', 'Текст', None,
+                      [f'user{number}@example.com'])
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboxEmail.objects.count(), 5)
+        self.assertEqual(Task.objects.count(), 1)
+        tasks.run_pending()
+        self.assertEqual([message.subject for message in mail.outbox],
+                         [f'Тема {number}' for number in range(5)])
+        self.assertEqual(len(OPENED), 3)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_message_survives_the_queue(self):
+        message = mail.EmailMultiAlternatives(
+            'Тема', 'Текст', 'from@example.com', ['to@example.com'],
+            bcc=['hidden@example.com'], reply_to=['reply@example.com'],
+            headers={'X-Tag': 'reset'})
+        message.attach_alternative('<p>Текст</p>', 'text/html')
+        message.send()
+        outbox.deliver()
+        sent = mail.outbox[0]
+        for field in ('subject', 'body', 'from_email', 'to', 'bcc',
+                      'reply_to', 'extra_headers', 'alternatives'):
+            self.assertEqual(getattr(sent, field), getattr(message, field))
+
+    def test_failed_message_is_retried_later_then_given_up(self):
+        send_mail('Тема', 'Текст', None, ['bad@example.com'])
+        send_mail('Тема', 'Текст', None, ['good@example.com'])
+        self.assertEqual(outbox.deliver(), 1)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.locked_until, timezone.now())
+        self.assertEqual(outbox.deliver(), 0)
+        OutboxEmail.objects.update(locked_until=None)
+        outbox.deliver()
+        self.assertTrue(OutboxEmail.objects.get().failed)
+
+    def test_throttle_is_shared_between_workers(self):
+        workers = [outbox.Throttle(100), outbox.Throttle(100)]
+        started = time.monotonic()
+        for number in range(6):
+            workers[number % 2].wait()
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    def test_earlier_delivery_moves_pending_task(self):
+        outbox.schedule(900)
+        outbox.schedule(10)
+        task = Task.objects.get()
+        self.assertLess(task.run_at, timezone.now() + timedelta(seconds=20))
+        outbox.schedule(600)
+        self.assertEqual(Task.objects.get().run_at, task.run_at)
@@ -1,6 +1,36 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.utils import timezone
 
+from . import search
 from .models import Comment, Follow, Post, Group
+from .paginator import EstimatedCountPaginator
+
+
+class PubDateFilter(admin.SimpleListFilter):
+    """Фильтр по фиксированным периодам.
+
+    Варианты не зависят от данных, поэтому, в отличие от date_hierarchy,
+    changelist не считает DISTINCT по датам всей таблицы.
+    """
+    title = 'дата публикации'
+    parameter_name = 'published'
+    PERIODS = {
+        'day': ('За сутки', timedelta(days=1)),
+        'week': ('За неделю', timedelta(days=7)),
+        'month': ('За месяц', timedelta(days=30)),
+        'year': ('За год', timedelta(days=365)),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, title) for key, (title, _) in self.PERIODS.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.PERIODS:
+            return queryset
+        _, period = self.PERIODS[self.value()]
+        return queryset.filter(pub_date__gte=timezone.now() - period)
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,13 +41,45 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = (PubDateFilter,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        if not search.match_expression(search_term):
+            return queryset.none(), False
+        return search.matching(queryset, search_term), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    search_fields = ('title', 'slug')
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'text', 'pub_date', 'author', 'post')
+    list_select_related = ('author', 'post__author', 'post__group')
+    raw_id_fields = ('author', 'post')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,243 @@
+"""Версионированный JSON API только для чтения.
+
+Повторяет ленты и страницы сайта, но строки берутся через values():
+модели не создаются, выбираются только запрошенные в ?fields= колонки.
+Списки листаются курсором, полная выгрузка постов отдаётся потоком
+NDJSON.
+"""
+from functools import partial, wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from core.routers import read_from_replica
+from .feed import FeedPaginator
+from .models import Comment, Group, Post, User
+from .paginator import CursorPaginator
+from .stats import for_user
+from .validators import (conditional, group_stamp, index_stamp, post_stamp,
+                         profile_stamp)
+from .settings import (API_EXPORT_CHUNK_SIZE, API_MAX_PAGE_SIZE,
+                       COMMENTS_ON_PAGE, POSTS_ON_PAGE)
+
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated': 'updated',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'post': 'post_id',
+}
+GROUP_FIELDS = ('id', 'title', 'slug', 'description')
+PROFILE_FIELDS = {
+    'id': 'id',
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'posts_count': 'stats__posts_count',
+    'following_count': 'stats__following_count',
+    'followers_count': 'stats__followers_count',
+}
+# Ключ курсора выбирается всегда, даже если его нет в ?fields=.
+CURSOR_FIELDS = ('pub_date', 'id')
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+NDJSON = 'application/x-ndjson; charset=utf-8'
+
+
+class ApiError(Exception):
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def respond(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def endpoint(view):
+    """Только GET и HEAD, ошибки — в JSON, а не страницей сайта."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return respond({'detail': 'Не найдено.'}, status=404)
+        except ApiError as error:
+            return respond({'detail': error.detail}, status=error.status)
+    return wrapper
+
+
+def login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            raise ApiError('Нужно войти.', status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def requested_fields(request, available):
+    """Поля из ?fields=a,b; без параметра — все."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}.')
+    return list(dict.fromkeys(names))
+
+
+def page_size(request, default):
+    value = request.GET.get('limit')
+    if value is None:
+        return default
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+    if not 1 <= size <= API_MAX_PAGE_SIZE:
+        raise ApiError(f'limit должен быть от 1 до {API_MAX_PAGE_SIZE}.')
+    return size
+
+
+def serializer(names, mapping):
+    """Функция, превращающая строку values() в словарь ответа."""
+    image = Post._meta.get_field('image').storage
+    lookups = [(name, mapping[name]) for name in names]
+
+    def serialize(row):
+        data = {name: row[lookup] for name, lookup in lookups}
+        if 'image' in data:
+            data['image'] = data['image'] and image.url(data['image']) or None
+        return data
+    return serialize
+
+
+def columns(names, mapping, extra=()):
+    return list(dict.fromkeys(
+        [mapping[name] for name in names] + list(extra)))
+
+
+def listing(request, queryset, mapping, default_size,
+            paginator=CursorPaginator):
+    """Страница курсорной пагинации по (pub_date, id)."""
+    names = requested_fields(request, mapping)
+    rows = queryset.order_by().values(
+        *columns(names, mapping, CURSOR_FIELDS))
+    page = paginator(rows, page_size(request, default_size)).get_page(
+        request.GET.get('cursor'))
+    serialize = serializer(names, mapping)
+    return {
+        'results': [serialize(row) for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def first(queryset, names, mapping=None, **lookup):
+    """Одна строка values() по условию или 404."""
+    mapping = mapping or {name: name for name in names}
+    row = queryset.filter(**lookup).values(*columns(names, mapping)).first()
+    if row is None:
+        raise Http404
+    return serializer(names, mapping)(row)
+
+
+@endpoint
+@read_from_replica
+@conditional(index_stamp)
+def index(request):
+    return respond(listing(request, Post.objects, POST_FIELDS,
+                           POSTS_ON_PAGE))
+
+
+@endpoint
+@read_from_replica
+@conditional(group_stamp)
+def group_posts(request, slug):
+    group = first(Group.objects, GROUP_FIELDS, slug=slug)
+    data = listing(request, Post.objects.filter(group_id=group['id']),
+                   POST_FIELDS, POSTS_ON_PAGE)
+    return respond({'group': group, **data})
+
+
+@endpoint
+@read_from_replica
+@conditional(profile_stamp)
+def profile(request, username):
+    author = first(User.objects, PROFILE_FIELDS, PROFILE_FIELDS,
+                   username=username)
+    if author['posts_count'] is None:
+        # Строка счётчиков создаётся с пользователем; нет её только у
+        # старых записей, и for_user заведёт её один раз.
+        stats = for_user(User(pk=author['id']))
+        author.update({field: getattr(stats, field) for field in (
+            'posts_count', 'following_count', 'followers_count')})
+    data = listing(request, Post.objects.filter(author_id=author['id']),
+                   POST_FIELDS, POSTS_ON_PAGE)
+    return respond({'author': author, **data})
+
+
+@endpoint
+@read_from_replica
+@conditional(post_stamp)
+def post_detail(request, post_id):
+    names = requested_fields(request, POST_FIELDS)
+    return respond(first(Post.objects, names, POST_FIELDS, id=post_id))
+
+
+@endpoint
+@read_from_replica
+@conditional(post_stamp)
+def post_comments(request, post_id):
+    get_object_or_404(Post.objects.only('id'), id=post_id)
+    return respond(listing(request, Comment.objects.filter(post_id=post_id),
+                           COMMENT_FIELDS, COMMENTS_ON_PAGE))
+
+
+@endpoint
+@login_required
+@read_from_replica
+def follow_index(request):
+    return respond(listing(request, Post.objects, POST_FIELDS, POSTS_ON_PAGE,
+                           partial(FeedPaginator, request.user)))
+
+
+@endpoint
+@read_from_replica
+def export(request):
+    """Все посты потоком NDJSON, по строке на пост.
+
+    Фильтры ?group= и ?author= сужают выгрузку. Строки читаются
+    итератором пачками, поэтому память не зависит от размера выгрузки.
+    """
+    names = requested_fields(request, POST_FIELDS)
+    queryset = Post.objects.order_by('id')
+    if request.GET.get('group'):
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    # Поток читается уже после выхода из представления, поэтому базу
+    # выбираем сейчас, пока действует read_from_replica.
+    rows = queryset.using(queryset.db).values(
+        *columns(names, POST_FIELDS)).iterator(
+            chunk_size=API_EXPORT_CHUNK_SIZE)
+    serialize = serializer(names, POST_FIELDS)
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return StreamingHttpResponse(
+        (encoder.encode(serialize(row)) + '\n' for row in rows),
+        content_type=NDJSON)
@@ -0,0 +1,29 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/',
+         api.index,
+         name='index'),
+    path('posts/export/',
+         api.export,
+         name='export'),
+    path('posts/<int:post_id>/',
+         api.post_detail,
+         name='post_detail'),
+    path('posts/<int:post_id>/comments/',
+         api.post_comments,
+         name='post_comments'),
+    path('groups/<slug:slug>/',
+         api.group_posts,
+         name='group_list'),
+    path('profiles/<str:username>/',
+         api.profile,
+         name='profile'),
+    path('follow/',
+         api.follow_index,
+         name='follow_index'),
+]
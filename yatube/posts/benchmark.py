@@ -0,0 +1,279 @@
+"""Нагрузочный прогон основных страниц на синтетических данных.
+
+Данные строит mixer с Faker: у авторов степенное распределение числа
+постов и подписчиков, как в живых соцсетях. Каждую страницу запрашивает
+тестовый клиент, по прогону считаются перцентили времени ответа, число
+запросов к базе и пик памяти.
+
+Отдельный прогон concurrency сравнивает WSGI и ASGI при множестве
+медленных клиентов: каждый долго шлёт запрос и долго читает ответ.
+"""
+import asyncio
+import io
+import json
+import math
+import random
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mixer.backend.django import Mixer
+from PIL import Image
+
+from core.asgi import AsgiHandler, environ
+from .models import Comment, Follow, Group, Post, User
+from .settings import BENCHMARK_IMAGE_SHARE, BENCHMARK_TOLERANCE
+
+GROUPS = 10
+IMAGES = 5
+MAX_FOLLOWING = 30
+TRACED_REQUESTS = 5
+PERCENTILES = (50, 95, 99)
+
+
+def skewed(rng, population, count):
+    """Выбор с весами 1/ранг: у немногих — большая часть всего."""
+    weights = [1 / rank for rank in range(1, len(population) + 1)]
+    return rng.choices(population, weights=weights, k=count)
+
+
+def make_images(count, rng):
+    names = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (960, 540), color).save(buffer, 'JPEG')
+        names.append(Post.image.field.storage.save(
+            f'posts/benchmark-{"%02x%02x%02x" % color}.jpg', buffer))
+    return names
+
+
+def generate(users, posts, comments, seed=0):
+    """Заполняет базу; сигналы моделей строят ленты, счётчики и индекс."""
+    rng = random.Random(seed)
+    mixer = Mixer(locale='ru_RU')
+    mixer.faker.seed_instance(seed)
+    people = mixer.cycle(users).blend(
+        User, username=(f'user{index}' for index in range(users)))
+    groups = mixer.cycle(GROUPS).blend(
+        Group, slug=(f'group-{index}' for index in range(GROUPS)))
+    images = make_images(IMAGES, rng)
+    created = []
+    for author in skewed(rng, people, posts):
+        image = (rng.choice(images)
+                 if rng.random() < BENCHMARK_IMAGE_SHARE else '')
+        created.append(mixer.blend(
+            Post, author=author, group=rng.choice(groups + [None]),
+            text=mixer.faker.paragraph(), image=image,
+            image_variants=''))
+    for post in skewed(rng, created, comments):
+        mixer.blend(Comment, post=post, author=rng.choice(people),
+                    text=mixer.faker.sentence())
+    for user in people:
+        authors = set(skewed(rng, people, rng.randint(1, MAX_FOLLOWING)))
+        for author in authors - {user}:
+            Follow.objects.create(user=user, author=author)
+    return people
+
+
+def scenarios(people):
+    """Имя страницы, метод, адрес, данные формы и пользователь."""
+    reader, author = people[-1], people[0]
+    post = Post.objects.filter(author=author).order_by('-pub_date').first()
+    group = Group.objects.order_by('pk').first()
+    return [
+        ('index', 'get', reverse('posts:index'), None, None),
+        ('group_posts', 'get',
+         reverse('posts:group_list', args=[group.slug]), None, None),
+        ('profile', 'get',
+         reverse('posts:profile', args=[author.username]), None, None),
+        ('post_detail', 'get',
+         reverse('posts:post_detail', args=[post.pk]), None, None),
+        ('follow_index', 'get', reverse('posts:follow_index'), None, reader),
+        ('post_create', 'post', reverse('posts:post_create'),
+         {'text': 'Пост из нагрузочного прогона', 'group': group.pk}, reader),
+    ]
+
+
+def percentile(values, rank):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+def request(client, method, url, data):
+    response = getattr(client, method)(url, data)
+    if response.status_code >= 400:
+        raise RuntimeError(f'{url}: {response.status_code}')
+
+
+def measure(method, url, data, user, requests):
+    """Время и запросы — по холодному и тёплым кешам, память — отдельно.
+
+    tracemalloc заметно замедляет код, поэтому память меряется в
+    отдельном коротком проходе и на время не влияет.
+    """
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    cache.clear()
+    timings, queries, memory = [], [], []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            request(client, method, url, data)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(context.captured_queries))
+    cache.clear()
+    for _ in range(min(requests, TRACED_REQUESTS)):
+        tracemalloc.start()
+        request(client, method, url, data)
+        memory.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+    result = {f'p{rank}_ms': round(percentile(timings, rank), 2)
+              for rank in PERCENTILES}
+    result['queries'] = max(queries)
+    result['memory_kib'] = round(max(memory))
+    return result
+
+
+def run(people, requests):
+    return {
+        name: measure(method, url, data, user, requests)
+        for name, method, url, data, user in scenarios(people)
+    }
+
+
+def _scope(url, user):
+    headers = [(b'host', b'localhost')]
+    if user is not None:
+        client = Client()
+        client.force_login(user)
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME]
+        headers.append((b'cookie', f'{cookie.key}={cookie.value}'.encode()))
+    return {
+        'type': 'http', 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': url, 'root_path': '', 'query_string': b'',
+        'headers': headers, 'server': ('localhost', 80),
+        'client': ('127.0.0.1', 0),
+    }
+
+
+def _summary(latencies, elapsed):
+    result = {'rps': round(len(latencies) / elapsed, 1)}
+    result.update({f'p{rank}_ms': round(percentile(latencies, rank) * 1000)
+                   for rank in PERCENTILES[:2]})
+    return result
+
+
+def _check(status, url):
+    if status >= 400:
+        raise RuntimeError(f'{url}: {status}')
+
+
+def wsgi_clients(application, scope, clients, threads, delay):
+    """Потоковый WSGI-сервер: поток занят соединением целиком."""
+    def connection(submitted):
+        time.sleep(delay)
+        statuses = []
+        result = application(
+            environ(scope, io.BytesIO()),
+            lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(result)
+        finally:
+            result.close()
+        time.sleep(delay)
+        _check(int(statuses[0].split()[0]), scope['path'])
+        return time.perf_counter() - submitted
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(connection, started) for _ in range(clients)]
+        latencies = [future.result() for future in futures]
+    return _summary(latencies, time.perf_counter() - started)
+
+
+def asgi_clients(handler, scope, clients, delay):
+    """ASGI: медленный клиент ждёт в цикле событий, а не в потоке."""
+    async def connection(started):
+        async def receive():
+            await asyncio.sleep(delay)
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                _check(message['status'], scope['path'])
+            elif not message.get('more_body'):
+                await asyncio.sleep(delay)
+
+        await handler(scope, receive, send)
+        return time.perf_counter() - started
+
+    async def main():
+        started = time.perf_counter()
+        latencies = await asyncio.gather(
+            *(connection(started) for _ in range(clients)))
+        return _summary(latencies, time.perf_counter() - started)
+
+    return asyncio.run(main())
+
+
+def concurrency(people, clients, threads, delay):
+    """Пропускная способность и задержки страниц для чтения под WSGI и ASGI.
+
+    Пул потоков у обоих одинаковый, клиенты тоже: задержка delay и на
+    отправку запроса, и на чтение ответа.
+    """
+    application = get_wsgi_application()
+    handler = AsgiHandler(application, threads)
+    results = {}
+    try:
+        for name, method, url, data, user in scenarios(people):
+            if method != 'get':
+                continue
+            scope = _scope(url, user)
+            results[name] = {
+                'wsgi': wsgi_clients(
+                    application, scope, clients, threads, delay),
+                'asgi': asgi_clients(handler, scope, clients, delay),
+            }
+    finally:
+        handler.executor.shutdown()
+    return results
+
+
+def compare(results, baseline, tolerance=BENCHMARK_TOLERANCE):
+    """Описания регрессий относительно сохранённого прогона."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, value in current.items():
+            limit = previous.get(metric)
+            if metric == 'queries':
+                worse = limit is not None and value > limit
+            else:
+                worse = limit is not None and value > limit * (1 + tolerance)
+            if worse:
+                regressions.append(f'{name}.{metric}: {limit} -> {value}')
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump(results, stream, indent=2, sort_keys=True)
+        stream.write('\n')
@@ -0,0 +1,307 @@
+"""Потоковый импорт и экспорт постов, комментариев, групп и подписок.
+
+Строки читаются и пишутся пачками, поэтому память не зависит от
+размера файла. После каждой пачки импорт обновляет производные данные:
+ленты, счётчики и поисковый индекс.
+"""
+import contextlib
+import csv
+import json
+from collections import Counter
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, feed, search, stats, validators
+from .follows import followed
+from .models import Comment, FeedEntry, Follow, Group, Post, User
+
+FIELDS = {
+    'group': ('id', 'title', 'slug', 'description'),
+    'post': ('id', 'text', 'pub_date', 'author', 'group', 'image'),
+    'comment': ('id', 'text', 'pub_date', 'author', 'post'),
+    'follow': ('user', 'author'),
+}
+MODELS = {
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+LOOKUPS = {
+    'author': 'author__username',
+    'user': 'user__username',
+    'group': 'group__slug',
+    'post': 'post_id',
+}
+
+
+class BulkImportError(Exception):
+    pass
+
+
+def read_rows(stream, data_format):
+    if data_format == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value if value != '' else None
+                   for key, value in row.items()}
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Writer:
+    def __init__(self, stream, data_format, fields):
+        self.stream = stream
+        self.data_format = data_format
+        if data_format == 'csv':
+            self.csv = csv.DictWriter(stream, fieldnames=fields)
+            self.csv.writeheader()
+
+    def write(self, row):
+        if self.data_format == 'csv':
+            self.csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+def export(kind, stream, data_format, chunk_size):
+    """Пишет все строки модели; возвращает их число."""
+    fields = FIELDS[kind]
+    lookups = [LOOKUPS.get(field, field) for field in fields]
+    queryset = MODELS[kind].objects.order_by('pk').values_list(*lookups)
+    writer = Writer(stream, data_format, fields)
+    total = 0
+    for values in queryset.iterator(chunk_size=chunk_size):
+        row = dict(zip(fields, values))
+        if row.get('pub_date') is not None:
+            row['pub_date'] = row['pub_date'].isoformat()
+        writer.write(row)
+        total += 1
+    return total
+
+
+@contextlib.contextmanager
+def keep_dates(model):
+    """Отключает auto_now и auto_now_add, чтобы сохранить даты из файла."""
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False)
+              or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _users(rows, *keys):
+    names = {row[key] for row in rows for key in keys}
+    users = User.objects.in_bulk(names, field_name='username')
+    missing = names - set(users)
+    if missing:
+        raise BulkImportError(
+            f'Нет пользователей: {", ".join(sorted(missing))}')
+    return {name: user.id for name, user in users.items()}
+
+
+def _date(value, default):
+    if not value:
+        return default
+    date = parse_datetime(value)
+    if date is None:
+        raise BulkImportError(f'Неверная дата: {value}')
+    return date
+
+
+def _post_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BulkImportError(f'Неверный пост: {value!r}')
+
+
+def _reset_sequence(model):
+    """Сдвигает счётчик id за загруженные явно, иначе новые записи
+    упрутся в занятые id. В SQLite и MySQL счётчик сдвигается сам."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def _assign_ids(model, objects):
+    """Проставляет id заранее, если база не возвращает их из bulk_create."""
+    if connection.features.can_return_ids_from_bulk_insert:
+        return
+    next_id = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    for obj in objects:
+        if obj.pk is None:
+            obj.pk = next_id
+            next_id += 1
+
+
+def _build_groups(rows):
+    now = timezone.now()
+    groups = [Group(id=row.get('id'), title=row['title'], slug=row['slug'],
+                    description=row.get('description') or '', updated=now)
+              for row in rows]
+    _assign_ids(Group, groups)
+    return groups
+
+
+def _build_posts(rows):
+    users = _users(rows, 'author')
+    slugs = {row['group'] for row in rows if row.get('group')}
+    groups = {slug: group.id for slug, group in
+              Group.objects.in_bulk(slugs, field_name='slug').items()}
+    if slugs - set(groups):
+        raise BulkImportError(
+            f'Нет групп: {", ".join(sorted(slugs - set(groups)))}')
+    now = timezone.now()
+    posts = [
+        Post(id=row.get('id'), text=row['text'],
+             pub_date=_date(row.get('pub_date'), now), updated=now,
+             author_id=users[row['author']],
+             group_id=groups.get(row.get('group')),
+             image=row.get('image') or '')
+        for row in rows
+    ]
+    _assign_ids(Post, posts)
+    return posts
+
+
+def _build_comments(rows):
+    users = _users(rows, 'author')
+    post_ids = {_post_id(row.get('post')) for row in rows}
+    missing = post_ids - set(Post.objects.filter(
+        id__in=post_ids).values_list('id', flat=True))
+    if missing:
+        raise BulkImportError(
+            f'Нет постов: {", ".join(map(str, sorted(missing)))}')
+    now = timezone.now()
+    comments = [
+        Comment(id=row.get('id'), text=row['text'],
+                pub_date=_date(row.get('pub_date'), now),
+                author_id=users[row['author']],
+                post_id=_post_id(row['post']))
+        for row in rows
+    ]
+    _assign_ids(Comment, comments)
+    return comments
+
+
+def _build_follows(rows):
+    users = _users(rows, 'user', 'author')
+    pairs = {(users[row['user']], users[row['author']])
+             for row in rows if row['user'] != row['author']}
+    pairs -= set(Follow.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        author_id__in={author_id for _, author_id in pairs},
+    ).values_list('user_id', 'author_id'))
+    return [Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs]
+
+
+def _after_posts(posts):
+    if search.available():
+        search.index_rows([(post.id, post.text) for post in posts])
+    for author_id, count in Counter(
+            post.author_id for post in posts).items():
+        stats.increment(author_id, posts_count=count)
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.author_id, []).append(post)
+    followers = Follow.objects.filter(
+        author_id__in=by_author, materialized=True
+    ).values_list('user_id', 'author_id')
+    feed._insert(
+        FeedEntry(user_id=user_id, post_id=post.id, author_id=author_id,
+                  pub_date=post.pub_date)
+        for user_id, author_id in followers.iterator()
+        for post in by_author[author_id]
+    )
+
+
+def _after_follows(follows):
+    pairs = {(follow.user_id, follow.author_id) for follow in follows}
+    follows = [
+        follow for follow in Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).select_related('author')
+        if (follow.user_id, follow.author_id) in pairs
+    ]
+    for follow in follows:
+        followed(follow)
+
+
+BUILDERS = {
+    'group': (_build_groups, None),
+    'post': (_build_posts, _after_posts),
+    'comment': (_build_comments, None),
+    'follow': (_build_follows, _after_follows),
+}
+
+
+def _rejected(model, objects):
+    """Номер первого объекта, который база не принимает, и ошибка.
+
+    Объекты вставляются по одному в транзакции, которая потом
+    откатывается. Если по одному всё проходит, возвращает (None, None).
+    """
+    with transaction.atomic():
+        try:
+            for number, obj in enumerate(objects):
+                try:
+                    with transaction.atomic():
+                        model.objects.bulk_create([obj])
+                except IntegrityError as error:
+                    return number, error
+        finally:
+            transaction.set_rollback(True)
+    return None, None
+
+
+def import_rows(kind, rows, batch_size):
+    """Загружает строки пачками; каждая пачка — отдельная транзакция."""
+    model = MODELS[kind]
+    build, after = BUILDERS[kind]
+    rows = iter(rows)
+    total = 0
+    with keep_dates(model):
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            objects = []
+            try:
+                with transaction.atomic():
+                    objects = build(batch)
+                    model.objects.bulk_create(objects)
+                    if after is not None and objects:
+                        after(objects)
+            except IntegrityError as error:
+                number, reason = _rejected(model, objects)
+                # Подписки builder прореживает: номер объекта — не строка.
+                if number is None or len(objects) != len(batch):
+                    raise BulkImportError(
+                        f'Строки {total + 1}-{total + len(batch)}: {error}; '
+                        f'загружено строк: {total}')
+                raise BulkImportError(
+                    f'Строка {total + number + 1}: {reason}; '
+                    f'загружено строк: {total}')
+            total += len(batch)
+    if total:
+        _reset_sequence(model)
+    caching.bump(caching.POSTS)
+    validators.invalidate(validators.ALL)
+    return total
@@ -0,0 +1,98 @@
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+from core.metrics import registry
+from .settings import (STAMPEDE_BETA, STAMPEDE_GRACE, STAMPEDE_LOCK_TIMEOUT,
+                       STAMPEDE_WAIT)
+
+GENERATION_KEY = 'generation:{}'
+LOCK_KEY = 'lock:{}'
+POSTS = 'posts'
+POLL_INTERVAL = 0.05
+
+
+def _fresh():
+    return int(time.time() * 1000)
+
+
+def generation(name=POSTS):
+    """Текущее поколение данных; входит в ключи кеша страниц."""
+    key = GENERATION_KEY.format(name)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _fresh(), None)
+        value = cache.get(key)
+    return value
+
+
+def bump(name=POSTS):
+    """Сдвигает поколение, делая все старые ключи недостижимыми."""
+    key = GENERATION_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh(), None)
+
+
+def _expired(entry):
+    """Истекло ли значение, с вероятностным ранним пересчётом (XFetch).
+
+    Чем дороже было вычисление и чем ближе срок, тем вероятнее, что
+    запрос пересчитает значение заранее, пока остальные берут старое.
+    """
+    _, cost, expires = entry
+    if expires is None:
+        return False
+    early = -cost * STAMPEDE_BETA * math.log(1 - random.random())
+    return time.time() + early >= expires
+
+
+def _compute(key, compute, timeout):
+    started = time.time()
+    value = compute()
+    cost = time.time() - started
+    expires = None if timeout is None else time.time() + timeout
+    physical = None if timeout is None else timeout + STAMPEDE_GRACE
+    cache.set(key, (value, cost, expires), physical)
+    return value
+
+
+def remember(key, compute, timeout, family=None):
+    """get_or_set, защищённый от лавины пересчётов.
+
+    Значение пересчитывает один запрос, взявший блокировку; остальные
+    до конца пересчёта получают прежнее значение, которое хранится
+    дольше логического срока на STAMPEDE_GRACE. Исход каждого вызова
+    попадает в метрики под именем family.
+    """
+    family = family or key.split(':', 1)[0]
+    entry = cache.get(key)
+    if entry is not None and not _expired(entry):
+        registry.count_cache(family, 'hit')
+        return entry[0]
+    lock = LOCK_KEY.format(key)
+    deadline = time.time() + STAMPEDE_WAIT
+    while not cache.add(lock, 1, STAMPEDE_LOCK_TIMEOUT):
+        if entry is not None:
+            registry.count_cache(family, 'stale')
+            return entry[0]
+        if time.time() >= deadline:
+            registry.count_cache(family, 'miss')
+            return compute()
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            registry.count_cache(family, 'hit')
+            return entry[0]
+    try:
+        current = cache.get(key)
+        if current is not None and not _expired(current):
+            registry.count_cache(family, 'hit')
+            return current[0]
+        registry.count_cache(family, 'miss' if entry is None else 'early')
+        return _compute(key, compute, timeout)
+    finally:
+        cache.delete(lock)
@@ -0,0 +1,144 @@
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import stats
+from .models import FeedEntry, Follow, Post
+from .paginator import PREVIOUS, CursorPage, CursorPaginator
+from .settings import FEED_BATCH_SIZE, FEED_PULL_THRESHOLD
+
+
+def is_prolific(author):
+    """Слишком плодовитого автора не раскладываем по лентам."""
+    return stats.for_user(author).posts_count > FEED_PULL_THRESHOLD
+
+
+def _insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, FEED_BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id,
+        materialized=True
+    ).values_list('user_id', flat=True)
+    _insert(
+        FeedEntry(user_id=user_id, post_id=post.id, author_id=post.author_id,
+                  pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(follow):
+    """Заполняет ленту постами автора после подписки."""
+    materialized = not is_prolific(follow.author)
+    if follow.materialized != materialized:
+        Follow.objects.filter(pk=follow.pk).update(materialized=materialized)
+        follow.materialized = materialized
+    if not materialized:
+        # Отложенная раскладка могла успеть положить посты автора.
+        prune(follow.user_id, follow.author_id)
+        return
+    posts = Post.objects.filter(
+        author_id=follow.author_id).values_list('id', 'pub_date')
+    _insert(
+        FeedEntry(user_id=follow.user_id, post_id=post_id,
+                  author_id=follow.author_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def follow_posts(user):
+    """Посты ленты подписок одним запросом к Post.
+
+    Нужен для нумерованных страниц; курсорные листает FeedPaginator.
+    """
+    condition = Q(id__in=FeedEntry.objects.filter(
+        user=user).values('post_id'))
+    if Follow.objects.filter(user=user, materialized=False).exists():
+        condition |= Q(author_id__in=Follow.objects.filter(
+            user=user, materialized=False).values('author_id'))
+    return Post.objects.filter(condition)
+
+
+class FeedPaginator(CursorPaginator):
+    """Keyset-пагинация ленты подписок по (pub_date, id).
+
+    Материализованная часть листается прямо по индексу FeedEntry
+    (user, -pub_date, -post), посты плодовитых авторов — по индексу
+    постов автора. Две страницы сливаются, и из object_list читаются
+    только посты итоговой страницы.
+    """
+
+    def __init__(self, user, object_list, per_page):
+        super().__init__(object_list, per_page)
+        self.user = user
+
+    def _sources(self, cursor):
+        entries = FeedEntry.objects.filter(user=self.user).values(
+            'pub_date', 'post_id')
+        pages = [CursorPaginator(
+            entries, self.per_page, ordering=('-pub_date', '-post_id')
+        ).get_page(cursor)]
+        # По автору на запрос: каждый идёт по индексу (author, -pub_date).
+        pulled = Follow.objects.filter(
+            user=self.user, materialized=False
+        ).values_list('author_id', flat=True)
+        for author_id in pulled:
+            posts = Post.objects.filter(author_id=author_id).values(
+                'pub_date', 'id')
+            pages.append(CursorPaginator(
+                posts, self.per_page).get_page(cursor))
+        return pages
+
+    def get_page(self, cursor=None):
+        direction, values = self.parse(cursor)
+        pages = self._sources(cursor)
+        keys = sorted({
+            (row['pub_date'], row.get('post_id', row.get('id')))
+            for page in pages for row in page
+        }, reverse=True)
+        if direction == PREVIOUS:
+            has_more = len(keys) > self.per_page or any(
+                page.has_previous() for page in pages)
+            keys = keys[-self.per_page:]
+            has_next, has_previous = True, has_more
+        else:
+            has_more = len(keys) > self.per_page or any(
+                page.has_next() for page in pages)
+            keys = keys[:self.per_page]
+            has_next, has_previous = has_more, values is not None
+        ids = [post_id for _, post_id in keys]
+        rows = {}
+        if ids:
+            for row in self.object_list.order_by().filter(id__in=ids):
+                rows[row['id'] if isinstance(row, dict) else row.id] = row
+        return CursorPage([rows[post_id] for post_id in ids
+                           if post_id in rows],
+                          self, has_next=has_next, has_previous=has_previous)
+
+
+def rebuild(users=None):
+    """Пересобирает ленты с нуля; возвращает число записей."""
+    follows = Follow.objects.select_related('author')
+    entries = FeedEntry.objects.all()
+    if users is not None:
+        follows = follows.filter(user__in=users)
+        entries = entries.filter(user__in=users)
+    with transaction.atomic():
+        entries.delete()
+        for follow in follows.iterator():
+            backfill(follow)
+    return entries.count()
@@ -0,0 +1,57 @@
+"""Подписка и отписка одним запросом, без гонки «проверил — вставил».
+
+Запись идёт мимо ORM, сигналы модели не срабатывают, поэтому ленту и
+счётчики обновляют followed и unfollowed — те же, что зовут сигналы.
+"""
+from django.db import connection, transaction
+
+from core import tasks
+from . import feed, stats, validators
+from .models import Follow
+
+TABLE = Follow._meta.db_table
+INSERT = (
+    f'INSERT INTO {TABLE} (user_id, author_id, materialized) '
+    f'VALUES (%s, %s, %s) ON CONFLICT (user_id, author_id) DO NOTHING'
+)
+DELETE = f'DELETE FROM {TABLE} WHERE user_id = %s AND author_id = %s'
+
+
+def followed(follow):
+    validators.touch(validators.FOLLOWS)
+    tasks.enqueue('posts.backfill', follow.user_id, follow.author_id,
+                  dedup_key=f'backfill:{follow.user_id}:{follow.author_id}')
+    stats.increment(follow.user_id, following_count=1)
+    stats.increment(follow.author_id, followers_count=1)
+
+
+def unfollowed(user_id, author_id):
+    validators.touch(validators.FOLLOWS)
+    feed.prune(user_id, author_id)
+    stats.increment(user_id, following_count=-1)
+    stats.increment(author_id, followers_count=-1)
+
+
+def follow(user, author):
+    """Подписывает; повторный вызов ничего не меняет. True, если подписал."""
+    if user.pk == author.pk:
+        return False
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(INSERT, [user.pk, author.pk, True])
+            created = cursor.rowcount == 1
+        if created:
+            followed(Follow.objects.get(user=user, author=author))
+            tasks.enqueue('posts.notify_follow', user.pk, author.pk)
+    return created
+
+
+def unfollow(user, author):
+    """Отписывает; без подписки ничего не делает. True, если отписал."""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(DELETE, [user.pk, author.pk])
+            deleted = cursor.rowcount == 1
+        if deleted:
+            unfollowed(user.pk, author.pk)
+    return deleted
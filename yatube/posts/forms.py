@@ -1,12 +1,58 @@
 from django import forms
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
 
+from . import thumbnails, uploads
 from .models import Comment, Post
+from .settings import POST_IMAGE_MAX_PIXELS, POST_IMAGE_MAX_UPLOAD_SIZE
+
+
+class PostImageField(forms.ImageField):
+    default_error_messages = {
+        'too_large': 'Файл больше %(limit)s.',
+        'too_many_pixels': 'Картинка больше %(limit)s пикселей.',
+    }
+
+    def to_python(self, data):
+        if isinstance(data, uploads.RejectedUpload):
+            raise forms.ValidationError(
+                self.error_messages['too_large'],
+                code='too_large',
+                params={'limit': filesizeformat(POST_IMAGE_MAX_UPLOAD_SIZE)})
+        if data is not None and hasattr(data, 'seek'):
+            data.seek(0)
+            try:
+                image = Image.open(data)
+            except Exception:
+                image = None
+            data.seek(0)
+            if image is not None and not uploads.check_dimensions(image):
+                raise forms.ValidationError(
+                    self.error_messages['too_many_pixels'],
+                    code='too_many_pixels',
+                    params={'limit': POST_IMAGE_MAX_PIXELS})
+        return super().to_python(data)
 
 
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': PostImageField}
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if image and 'image' in self.changed_data:
+            return uploads.process_image(image)
+        return image
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            self.instance.image_variants = ''
+        post = super().save(commit)
+        if commit and post.image and 'image' in self.changed_data:
+            thumbnails.schedule(post.id)
+        return post
 
 
 class CommentForm(forms.ModelForm):
@@ -0,0 +1,99 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from posts import benchmark
+from posts.settings import (BENCHMARK_CLIENT_DELAY, BENCHMARK_CLIENTS,
+                            BENCHMARK_COMMENTS, BENCHMARK_POSTS,
+                            BENCHMARK_REQUESTS, BENCHMARK_TOLERANCE,
+                            BENCHMARK_USERS)
+
+BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+COLUMNS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'memory_kib')
+CONCURRENCY_COLUMNS = ('rps', 'p50_ms', 'p95_ms')
+
+
+class Command(BaseCommand):
+    help = ('Гоняет основные страницы на синтетических данных во временной '
+            'базе и сравнивает результат с сохранённым')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=BENCHMARK_USERS)
+        parser.add_argument('--posts', type=int, default=BENCHMARK_POSTS)
+        parser.add_argument('--comments', type=int,
+                            default=BENCHMARK_COMMENTS)
+        parser.add_argument('--requests', type=int,
+                            default=BENCHMARK_REQUESTS,
+                            help='Запросов на каждую страницу')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', default=BASELINE,
+                            help='Файл с результатами для сравнения')
+        parser.add_argument('--save', action='store_true',
+                            help='Записать результат в файл --baseline')
+        parser.add_argument('--tolerance', type=float,
+                            default=BENCHMARK_TOLERANCE,
+                            help='Допустимый рост времени и памяти')
+        parser.add_argument('--concurrency', action='store_true',
+                            help='Сравнить WSGI и ASGI на медленных '
+                                 'клиентах вместо обычного прогона')
+        parser.add_argument('--clients', type=int, default=BENCHMARK_CLIENTS,
+                            help='Одновременных клиентов на страницу')
+        parser.add_argument('--threads', type=int,
+                            default=settings.ASGI_THREADS,
+                            help='Потоков у обоих серверов')
+        parser.add_argument('--client-delay', type=float,
+                            default=BENCHMARK_CLIENT_DELAY,
+                            help='Секунд на отправку запроса и на чтение '
+                                 'ответа')
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        databases = runner.setup_databases()
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(
+                    MEDIA_ROOT=media, DEBUG=False):
+                people = benchmark.generate(
+                    options['users'], options['posts'], options['comments'],
+                    options['seed'])
+                if options['concurrency']:
+                    results = benchmark.concurrency(
+                        people, options['clients'], options['threads'],
+                        options['client_delay'])
+                else:
+                    results = benchmark.run(people, options['requests'])
+        finally:
+            runner.teardown_databases(databases)
+        if options['concurrency']:
+            return self.report_concurrency(results)
+        self.report(results)
+        path = options['baseline']
+        if options['save']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            benchmark.save(results, path)
+            self.stdout.write(f'Сохранено в {path}')
+        elif os.path.exists(path):
+            regressions = benchmark.compare(
+                results, benchmark.load(path), options['tolerance'])
+            if regressions:
+                raise CommandError(
+                    'Регрессии: ' + '; '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"page":<14}' + ''.join(f'{column:>12}' for column in COLUMNS))
+        for name, result in results.items():
+            self.stdout.write(f'{name:<14}' + ''.join(
+                f'{result[column]:>12}' for column in COLUMNS))
+
+    def report_concurrency(self, results):
+        self.stdout.write(f'{"page":<14}{"server":<8}' + ''.join(
+            f'{column:>10}' for column in CONCURRENCY_COLUMNS))
+        for name, servers in results.items():
+            for server, result in servers.items():
+                self.stdout.write(f'{name:<14}{server:<8}' + ''.join(
+                    f'{result[column]:>10}' for column in CONCURRENCY_COLUMNS))
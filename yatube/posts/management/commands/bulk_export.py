@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+from posts.management.commands.bulk_import import data_format
+from posts.settings import BULK_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии или подписки в файл'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(bulk.MODELS))
+        parser.add_argument('path', help='Файл или - для stdout')
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument('--chunk-size', type=int,
+                            default=BULK_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.monotonic()
+        stream = (self.stdout if path == '-'
+                  else open(path, 'w', encoding='utf-8', newline=''))
+        try:
+            total = bulk.export(
+                options['kind'], stream,
+                data_format(path, options['format']), options['chunk_size'])
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с)')
@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+from posts.settings import BULK_BATCH_SIZE
+
+
+def data_format(path, requested):
+    if requested:
+        return requested
+    return 'csv' if path.endswith('.csv') else 'ndjson'
+
+
+class Command(BaseCommand):
+    help = 'Загружает группы, посты, комментарии или подписки из файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(bulk.MODELS))
+        parser.add_argument('path', help='Файл или - для stdin')
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument('--batch-size', type=int,
+                            default=BULK_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.monotonic()
+        stream = (sys.stdin if path == '-'
+                  else open(path, encoding='utf-8', newline=''))
+        try:
+            total = bulk.import_rows(
+                options['kind'],
+                bulk.read_rows(stream, data_format(path, options['format'])),
+                options['batch_size'])
+        except (bulk.BulkImportError, KeyError, ValueError) as error:
+            raise CommandError(f'Импорт прерван: {error!r}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} строк/с)'))
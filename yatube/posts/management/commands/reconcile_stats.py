@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики постов и подписок с таблицами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Сверить счётчики только этих пользователей')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        fixed = stats.reconcile(users)
+        self.stdout.write(self.style.SUCCESS(f'Исправлено строк: {fixed}'))
@@ -0,0 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+from posts.settings import THUMBNAIL_WORKERS
+
+
+class Command(BaseCommand):
+    help = 'Заранее строит варианты картинок для постов без них'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=THUMBNAIL_WORKERS,
+            help='Число потоков построения')
+
+    def handle(self, *args, **options):
+        missing = list(Post.objects.exclude(image='').filter(
+            image_variants='').values_list('id', flat=True))
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            list(pool.map(thumbnails.generate, missing))
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено миниатюр: {len(missing)}'))
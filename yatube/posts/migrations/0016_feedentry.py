@@ -0,0 +1,63 @@
+# Generated by Django 2.2.26 on 2026-10-18 05:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from posts.settings import FEED_PULL_THRESHOLD
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_auto_20211126_1636'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follow',
+            name='materialized',
+            field=models.BooleanField(default=True, help_text='Посты автора раскладываются в ленту подписчика при записи', verbose_name='Материализованная лента'),
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique feed entry'),
+        ),
+        # Тот же порог, что и при записи: посты плодовитых авторов
+        # подтягиваются при чтении и в ленты не раскладываются.
+        migrations.RunSQL(
+            [(
+                'UPDATE posts_follow SET materialized = ('
+                'SELECT COUNT(*) FROM posts_post p '
+                'WHERE p.author_id = posts_follow.author_id) <= %s',
+                [FEED_PULL_THRESHOLD],
+            )],
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'INSERT INTO posts_feedentry (user_id, post_id, author_id) '
+            'SELECT DISTINCT f.user_id, p.id, p.author_id '
+            'FROM posts_follow f '
+            'JOIN posts_post p ON p.author_id = f.author_id '
+            'WHERE f.materialized',
+            migrations.RunSQL.noop,
+        ),
+    ]
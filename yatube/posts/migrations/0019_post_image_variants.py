@@ -0,0 +1,18 @@
+# Generated by Django 2.2.26 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.TextField(blank=True, editable=False, help_text='JSON с размерами и форматами готовых миниатюр', verbose_name='Варианты картинки'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.26 on 2026-10-18 05:40
+
+from django.db import migrations, models
+import posts.uploads
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.uploads.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+from posts.stemmer import stems
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+        f'text, tokenize="unicode61 remove_diacritics 2")'
+    )
+    Post = apps.get_model('posts', 'Post')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [(post_id, stems(text)) for post_id, text in
+             Post.objects.values_list('id', 'text').iterator()]
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
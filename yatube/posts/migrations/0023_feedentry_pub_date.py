@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_follow_constraint_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedentry',
+            name='pub_date',
+            field=models.DateTimeField(help_text='Копия даты поста: лента листается по своему индексу', null=True, verbose_name='Дата публикации'),
+        ),
+        migrations.RunSQL(
+            'UPDATE posts_feedentry SET pub_date = ('
+            'SELECT pub_date FROM posts_post '
+            'WHERE posts_post.id = posts_feedentry.post_id)',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='feedentry',
+            name='pub_date',
+            field=models.DateTimeField(help_text='Копия даты поста: лента листается по своему индексу', verbose_name='Дата публикации'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='feed_user_pub_date'),
+        ),
+    ]
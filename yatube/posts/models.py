@@ -1,9 +1,12 @@
+import json
 import textwrap
 
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.db import models
 
 from core.models import CreateModel
+from .uploads import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -16,6 +19,10 @@ class Group(models.Model):
         verbose_name='Идентификатор'
     )
     description = models.TextField(verbose_name='Описание')
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -25,6 +32,23 @@ class Group(models.Model):
         return f'{self.title}'
 
 
+class PostQuerySet(models.QuerySet):
+    LISTING_FIELDS = (
+        'id', 'text', 'pub_date', 'updated', 'image', 'image_variants',
+        'author__id', 'author__username',
+        'group__id', 'group__slug', 'group__title', 'group__updated',
+    )
+
+    def for_listing(self):
+        """Всё, что нужно карточке поста, одним запросом."""
+        return self.select_related('author', 'group').only(
+            *self.LISTING_FIELDS)
+
+    def with_author_posts_count(self):
+        return self.annotate(
+            author_posts_count=models.F('author__stats__posts_count'))
+
+
 class Post(CreateModel):
     text = models.TextField(
         verbose_name='Текст',
@@ -34,12 +58,14 @@ class Post(CreateModel):
         User,
         on_delete=models.CASCADE,
         related_name='posts',
+        db_index=False,
         verbose_name='Автор'
     )
     group = models.ForeignKey(
         Group,
         on_delete=models.SET_NULL,
         related_name='posts',
+        db_index=False,
         blank=True,
         null=True,
         verbose_name='Группа',
@@ -48,11 +74,35 @@ class Post(CreateModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON с размерами и форматами готовых миниатюр'
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_pub_date'),
+            models.Index(fields=['-updated'], name='post_updated'),
+            models.Index(fields=['author', '-updated'],
+                         name='post_author_updated'),
+            models.Index(fields=['group', '-updated'],
+                         name='post_group_updated'),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -64,12 +114,32 @@ class Post(CreateModel):
             f'{self.group}'
         )
 
+    @property
+    def variants(self):
+        """Готовые миниатюры по форматам: {'JPEG': [(url, width), ...]}."""
+        variants = {}
+        for variant in json.loads(self.image_variants or '[]'):
+            variants.setdefault(variant['format'], []).append((
+                default_storage.url(variant['name']), variant['width']))
+        return variants
+
+
+class CommentQuerySet(models.QuerySet):
+    LISTING_FIELDS = (
+        'id', 'text', 'pub_date', 'post_id',
+        'author__id', 'author__username',
+    )
+
+    def for_listing(self):
+        return self.select_related('author').only(*self.LISTING_FIELDS)
+
 
 class Comment(CreateModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
         related_name='comments',
+        db_index=False,
         verbose_name='Пост'
     )
     author = models.ForeignKey(
@@ -83,8 +153,14 @@ class Comment(CreateModel):
         help_text='Напишите свой комментарий здесь'
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['post', '-pub_date'],
+                         name='comment_post_pub_date'),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -101,19 +177,34 @@ class Follow(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='follower',
+        db_index=False,
         verbose_name='Подписчик'
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='following',
+        db_index=False,
         verbose_name='Автор'
     )
+    materialized = models.BooleanField(
+        default=True,
+        verbose_name='Материализованная лента',
+        help_text='Посты автора раскладываются в ленту подписчика при записи'
+    )
 
     class Meta:
-        models.UniqueConstraint(
-            fields=['user', 'author'],
-            name='unique follow')
+        # Составные индексы начинаются с внешнего ключа, поэтому
+        # отдельные индексы по ключам не нужны (db_index=False).
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique follow'),
+        ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user'),
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
@@ -122,3 +213,81 @@ class Follow(models.Model):
             f'user: {self.user.username}, '
             f'author: {self.author.username}, '
         )
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+        help_text='Копия даты поста: лента листается по своему индексу'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique feed entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author'], name='feed_user_author'),
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='feed_user_pub_date'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+    def __str__(self):
+        return f'user: {self.user_id}, post: {self.post_id}'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя для профиля."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return (
+            f'user: {self.user_id}, '
+            f'posts: {self.posts_count}, '
+            f'following: {self.following_count}, '
+            f'followers: {self.followers_count}'
+        )
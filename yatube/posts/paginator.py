@@ -0,0 +1,221 @@
+import base64
+import collections.abc
+import hashlib
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .caching import remember
+from .settings import APPROXIMATE_COUNT_TIMEOUT, EXACT_COUNT_LIMIT
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Ключ должен поместиться в 64-битное целое базы.
+MAX_ID = 2 ** 63 - 1
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps(
+        [direction] + [value.isoformat() if hasattr(value, 'isoformat')
+                       else value for value in values],
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, *values = payload
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if direction not in (NEXT, PREVIOUS) or not values:
+        raise InvalidCursor(token)
+    return direction, values
+
+
+def valid_id(value):
+    """Целое в пределах BIGINT; bool — тоже int, но не ключ."""
+    return (isinstance(value, int) and not isinstance(value, bool)
+            and -MAX_ID <= value <= MAX_ID)
+
+
+class CursorPage(collections.abc.Sequence):
+    """Страница курсорной пагинации: знает только соседей, но не номер."""
+
+    cursor_mode = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.cursor_for(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.cursor_for(PREVIOUS, self.object_list[0])
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: запрос идёт по индексу от
+    значения ключа последней показанной записи.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+
+    def cursor_for(self, direction, obj):
+        # Строки values() — словари, объекты моделей — с атрибутами.
+        return encode_cursor(
+            direction,
+            [obj[field] if isinstance(obj, dict) else getattr(obj, field)
+             for field in self.fields]
+        )
+
+    def _values(self, raw_values):
+        values = []
+        for field, raw in zip(self.fields, raw_values):
+            if field == 'pub_date':
+                # parse_datetime бросает ValueError на датах вроде 30 февраля.
+                raw = parse_datetime(raw) if isinstance(raw, str) else None
+                if raw is None or raw.tzinfo is None:
+                    raise InvalidCursor(raw_values)
+            elif not valid_id(raw):
+                raise InvalidCursor(raw_values)
+            values.append(raw)
+        return values
+
+    def _keyset_filter(self, values, reverse):
+        """Лексикографическое условие «строго после ключа»."""
+        condition = None
+        for position in range(len(self.fields) - 1, -1, -1):
+            field = self.ordering[position]
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{self.fields[position]}__{lookup}':
+                        values[position]})
+            if condition is not None:
+                step |= Q(**{self.fields[position]: values[position]}) & (
+                    condition)
+            condition = step
+        return condition
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def parse(self, cursor):
+        """Направление и ключ курсора; неверный курсор — начало списка."""
+        if cursor:
+            try:
+                direction, raw_values = decode_cursor(cursor)
+                if len(raw_values) != len(self.fields):
+                    raise InvalidCursor(cursor)
+                return direction, self._values(raw_values)
+            except (InvalidCursor, ValueError, OverflowError):
+                pass
+        return NEXT, None
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу; неверный курсор даёт первую страницу."""
+        direction, values = self.parse(cursor)
+        reverse = direction == PREVIOUS
+        ordering = (tuple(self._flip(field) for field in self.ordering)
+                    if reverse else self.ordering)
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, reverse))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            return CursorPage(rows, self, has_next=True,
+                              has_previous=has_more)
+        return CursorPage(rows, self, has_next=has_more,
+                          has_previous=values is not None)
+
+    @cached_property
+    def count(self):
+        """Приблизительное число записей, кешируется на короткое время."""
+        key = 'approximate_count:' + hashlib.md5(
+            str(self.object_list.query).encode()).hexdigest()
+        return remember(
+            key, self.object_list.count, APPROXIMATE_COUNT_TIMEOUT)
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы без полного COUNT(*).
+
+    PostgreSQL отдаёт статистику планировщика, остальные базы —
+    максимальный первичный ключ. Маленькие таблицы считаются точно.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [model._meta.db_table])
+            row = cursor.fetchone()
+        estimate = row[0] if row else 0
+    else:
+        estimate = queryset.aggregate(last=Max('pk'))['last'] or 0
+    if estimate < EXACT_COUNT_LIMIT:
+        return queryset.count()
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для огромных таблиц: без фильтров число строк оценивается."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return super().count
+        key = f'estimated_count:{queryset.model._meta.label_lower}'
+        return remember(
+            key, lambda: estimate_count(queryset.order_by()),
+            APPROXIMATE_COUNT_TIMEOUT)
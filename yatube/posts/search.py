@@ -0,0 +1,157 @@
+import math
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .paginator import (NEXT, PREVIOUS, CursorPage, CursorPaginator,
+                        InvalidCursor, decode_cursor, encode_cursor,
+                        valid_id)
+from .settings import SEARCH_BATCH_SIZE
+from .stemmer import WORD, stem, stems
+
+FTS_TABLE = 'posts_post_fts'
+
+SEARCH_SQL = (
+    f'SELECT id, score FROM ('
+    f'SELECT rowid AS id, bm25({FTS_TABLE}) AS score '
+    f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) '
+)
+AFTER = 'WHERE score > %s OR (score = %s AND id > %s) '
+BEFORE = 'WHERE score < %s OR (score = %s AND id < %s) '
+FORWARD = 'ORDER BY score, id LIMIT %s'
+BACKWARD = 'ORDER BY score DESC, id DESC LIMIT %s'
+
+
+def available():
+    """FTS5-индекс есть только в SQLite."""
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.id])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.id, stems(post.text)])
+
+
+def unindex_post(post_id):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def index_rows(rows):
+    """Индексирует пары (id, текст) одним executemany."""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, text) '
+            f'VALUES (%s, %s)',
+            [(post_id, stems(text)) for post_id, text in rows])
+
+
+def rebuild():
+    """Пересобирает индекс по всем постам; возвращает их число."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    rows, total = [], 0
+    posts = Post.objects.order_by().values_list('id', 'text')
+    for row in posts.iterator(chunk_size=SEARCH_BATCH_SIZE):
+        rows.append(row)
+        if len(rows) == SEARCH_BATCH_SIZE:
+            index_rows(rows)
+            total += len(rows)
+            rows = []
+    index_rows(rows)
+    return total + len(rows)
+
+
+def match_expression(query):
+    """Запрос FTS5: все основы слов, каждая как префикс."""
+    terms = [stem(word) for word in WORD.findall(query)]
+    return ' '.join(f'"{term}"*' for term in terms if term)
+
+
+def matching(queryset, query):
+    """Оставляет в выборке постов только подходящие под запрос.
+
+    Условие целиком в RawSQL: в id__in подзапрос попал бы в двойные
+    скобки, и SQLite взял бы из него только первую строку.
+    """
+    table = queryset.model._meta.db_table
+    return queryset.annotate(search_match=RawSQL(
+        f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s)',
+        [match_expression(query)], output_field=BooleanField(),
+    )).filter(search_match=True)
+
+
+class SearchPaginator:
+    """Курсорная пагинация по релевантности (bm25, id)."""
+
+    def __init__(self, query, per_page):
+        self.expression = match_expression(query)
+        self.per_page = int(per_page)
+
+    def cursor_for(self, direction, obj):
+        return encode_cursor(direction, [obj.search_rank, obj.id])
+
+    def _decode(self, cursor):
+        direction, values = decode_cursor(cursor)
+        if len(values) != 2:
+            raise InvalidCursor(cursor)
+        score, post_id = values
+        if (not isinstance(score, (int, float)) or isinstance(score, bool)
+                or not math.isfinite(score) or not valid_id(post_id)):
+            raise InvalidCursor(cursor)
+        return direction, score, post_id
+
+    def get_page(self, cursor=None):
+        if not self.expression:
+            return CursorPage([], self, has_next=False, has_previous=False)
+        direction, params, sql = NEXT, [self.expression], SEARCH_SQL
+        positioned = False
+        if cursor:
+            try:
+                direction, score, post_id = self._decode(cursor)
+                sql += AFTER if direction == NEXT else BEFORE
+                params += [score, score, post_id]
+                positioned = True
+            except InvalidCursor:
+                direction = NEXT
+        reverse = direction == PREVIOUS
+        sql += BACKWARD if reverse else FORWARD
+        with connection.cursor() as db:
+            db.execute(sql, params + [self.per_page + 1])
+            rows = db.fetchall()
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+        posts = Post.objects.for_listing().in_bulk(
+            [post_id for post_id, _ in rows])
+        object_list = []
+        for post_id, score in rows:
+            if post_id in posts:
+                posts[post_id].search_rank = score
+                object_list.append(posts[post_id])
+        if reverse:
+            return CursorPage(object_list, self, has_next=True,
+                              has_previous=has_more)
+        return CursorPage(object_list, self, has_next=has_more,
+                          has_previous=positioned)
+
+
+def search_page(query, per_page, cursor=None):
+    if available():
+        return SearchPaginator(query, per_page).get_page(cursor)
+    posts = Post.objects.filter(text__icontains=query) if query.strip() else (
+        Post.objects.none())
+    return CursorPaginator(posts.for_listing(), per_page).get_page(cursor)
@@ -1 +1,36 @@
 POSTS_ON_PAGE = 10
+APPROXIMATE_COUNT_TIMEOUT = 60
+EXACT_COUNT_LIMIT = 10000
+FEED_PULL_THRESHOLD = 1000
+FEED_BATCH_SIZE = 500
+COMMENTS_ON_PAGE = 20
+INDEX_CACHE_TIMEOUT = 60 * 60
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_JPEG_QUALITY = 85
+SEARCH_BATCH_SIZE = 1000
+BULK_BATCH_SIZE = 1000
+BENCHMARK_USERS = 200
+BENCHMARK_POSTS = 2000
+BENCHMARK_COMMENTS = 3000
+BENCHMARK_REQUESTS = 50
+BENCHMARK_IMAGE_SHARE = 0.3
+BENCHMARK_TOLERANCE = 0.5
+REPLICA_CACHE_TIMEOUT = 30
+STAMPEDE_BETA = 1.0
+STAMPEDE_LOCK_TIMEOUT = 30
+STAMPEDE_GRACE = 60
+STAMPEDE_WAIT = 2
+VALIDATOR_TIMEOUT = 3600
+API_MAX_PAGE_SIZE = 100
+API_EXPORT_CHUNK_SIZE = 1000
+BENCHMARK_CLIENTS = 200
+BENCHMARK_CLIENT_DELAY = 0.2
+NOTIFY_BATCH_SIZE = 500
@@ -0,0 +1,140 @@
+import threading
+
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core import tasks
+from . import caching, follows, search, stats, validators
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+# Пользователи, которых сейчас удаляет этот поток: их посты и подписки
+# уходят каскадом, и поддерживать их счётчики и ленты незачем.
+_removing = threading.local()
+
+
+def removing(user_id):
+    return user_id in getattr(_removing, 'ids', ())
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, **kwargs):
+    # Счётчики сдвигает increment, а он строку не создаёт.
+    if created:
+        UserStats.objects.get_or_create(user_id=instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    if not hasattr(_removing, 'ids'):
+        _removing.ids = set()
+    _removing.ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    _removing.ids.discard(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        tasks.enqueue('posts.fan_out', instance.id,
+                      dedup_key=f'fan_out:{instance.id}')
+        tasks.enqueue('posts.notify_new_post', instance.id,
+                      dedup_key=f'notify_new_post:{instance.id}')
+
+
+@receiver(post_save, sender=Comment)
+def notify_comment(sender, instance, created, **kwargs):
+    if created:
+        tasks.enqueue('posts.notify_comment', instance.id)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    if not removing(instance.author_id):
+        stats.increment(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        follows.followed(instance)
+        tasks.enqueue('posts.notify_follow', instance.user_id,
+                      instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    user_id, author_id = instance.user_id, instance.author_id
+    if not removing(user_id) and not removing(author_id):
+        follows.unfollowed(user_id, author_id)
+        return
+    validators.touch(validators.FOLLOWS)
+    if not removing(user_id):
+        stats.increment(user_id, following_count=-1)
+    if not removing(author_id):
+        stats.increment(author_id, followers_count=-1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_posts_generation(sender, **kwargs):
+    caching.bump(caching.POSTS)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Пост могли перенести: страница прежней группы тоже изменится.
+    instance._previous_group_ids = () if instance._state.adding else list(
+        Post.objects.filter(pk=instance.pk).values_list('group_id', flat=True))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_stamps(sender, instance, **kwargs):
+    # Посты удаляемого автора уходят каскадом; их покрывает DELETIONS.
+    if not removing(instance.author_id):
+        validators.post_changed(
+            instance, getattr(instance, '_previous_group_ids', ()))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_stamps(sender, instance, **kwargs):
+    validators.invalidate(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_stamps(sender, **kwargs):
+    # Название группы есть на карточках постов любой страницы.
+    validators.invalidate(validators.ALL)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex_post(instance.id)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Group)
+def touch_deletions(sender, **kwargs):
+    validators.touch(validators.DELETIONS)
@@ -0,0 +1,58 @@
+from django.db.models import F
+
+from .models import Follow, Post, User, UserStats
+
+
+def actual(user_id):
+    """Счётчики, посчитанные по таблицам."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+    }
+
+
+def refresh(user_id):
+    """Пересчитывает строку счётчиков; возвращает её или None."""
+    if not User.objects.filter(pk=user_id).exists():
+        return None
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=actual(user_id))
+    return stats
+
+
+def increment(user_id, **deltas):
+    """Атомарно сдвигает счётчики через F-выражения.
+
+    Строку не создаёт: её нет — нечего и сдвигать, for_user и reconcile
+    посчитают счётчики с нуля.
+    """
+    UserStats.objects.filter(user_id=user_id).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def for_user(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return refresh(user.pk)
+
+
+def reconcile(users=None):
+    """Чинит расхождения счётчиков; возвращает число исправленных строк."""
+    users = User.objects.all() if users is None else users
+    fixed = 0
+    for user in users.select_related('stats').iterator():
+        counts = actual(user.pk)
+        try:
+            stats = user.stats
+        except UserStats.DoesNotExist:
+            stats = None
+        if stats is not None and all(
+                getattr(stats, field) == value
+                for field, value in counts.items()):
+            continue
+        UserStats.objects.update_or_create(user_id=user.pk, defaults=counts)
+        fixed += 1
+    return fixed
@@ -0,0 +1,83 @@
+"""Фоновые задачи записи: раскладка по лентам, миниатюры, уведомления.
+
+Каждая задача заново читает данные по id и молча выходит, если их уже
+нет: пост могли удалить, а подписку — отменить, пока задача ждала.
+"""
+from itertools import islice
+
+from django.urls import reverse
+
+from core.mail import digest
+from core.tasks import task
+from . import feed, thumbnails
+from .models import Comment, Follow, Post, User
+from .settings import NOTIFY_BATCH_SIZE
+
+# Виды дайджестов: уведомления одного вида копятся в одно письмо.
+COMMENTS = 'comments'
+FOLLOWERS = 'followers'
+NEW_POSTS = 'new_posts'
+COMMENTS_SUBJECT = 'Новые комментарии к вашим постам'
+FOLLOWERS_SUBJECT = 'Новые подписчики'
+NEW_POSTS_SUBJECT = 'Новые посты авторов, на которых вы подписаны'
+
+
+@task('posts.fan_out')
+def fan_out(post_id):
+    post = Post.objects.only(
+        'id', 'author_id', 'pub_date').filter(pk=post_id).first()
+    if post is not None:
+        feed.fan_out(post)
+
+
+@task('posts.backfill')
+def backfill(user_id, author_id):
+    follow = Follow.objects.select_related('author').filter(
+        user_id=user_id, author_id=author_id).first()
+    if follow is not None:
+        feed.backfill(follow)
+
+
+@task('posts.thumbnails')
+def build_thumbnails(post_id):
+    thumbnails.generate(post_id)
+
+
+@task('posts.notify_comment')
+def notify_comment(comment_id):
+    comment = Comment.objects.select_related(
+        'author', 'post__author').filter(pk=comment_id).first()
+    if comment is None:
+        return
+    author = comment.post.author
+    if not author.email or author == comment.author:
+        return
+    digest([author.email], COMMENTS, COMMENTS_SUBJECT,
+           f'{comment.author.username} пишет к посту '
+           f'«{comment.post.text[:50]}»:\n\n{comment.text}')
+
+
+@task('posts.notify_follow')
+def notify_follow(user_id, author_id):
+    follow = Follow.objects.select_related('user', 'author').filter(
+        user_id=user_id, author_id=author_id).first()
+    if follow is not None and follow.author.email:
+        digest([follow.author.email], FOLLOWERS, FOLLOWERS_SUBJECT,
+               f'На вас подписался {follow.user.username}.')
+
+
+@task('posts.notify_new_post')
+def notify_new_post(post_id):
+    post = Post.objects.select_related('author').filter(pk=post_id).first()
+    if post is None:
+        return
+    text = (f'{post.author.username}: «{post.text[:100]}»\n'
+            f'{reverse("posts:post_detail", args=[post.id])}')
+    emails = User.objects.filter(
+        follower__author_id=post.author_id).exclude(email='').values_list(
+            'email', flat=True).iterator()
+    while True:
+        batch = list(islice(emails, NOTIFY_BATCH_SIZE))
+        if not batch:
+            return
+        digest(batch, NEW_POSTS, NEW_POSTS_SUBJECT, text)
@@ -0,0 +1,34 @@
+from django import template
+
+from posts import thumbnails
+from posts.settings import POST_IMAGE_SIZE
+
+register = template.Library()
+
+SIZES = '(min-width: 768px) 75vw, 100vw'
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """Картинка поста с srcset; пока миниатюр нет, ставит их в очередь."""
+    width, height = POST_IMAGE_SIZE
+    variants = post.variants
+    if not variants:
+        thumbnails.schedule_once(post.id)
+        return {'src': post.image.url, 'width': width, 'height': height}
+    sources = [
+        {
+            'type': f'image/{image_format.lower()}',
+            'srcset': ', '.join(f'{url} {size}w' for url, size in items),
+        }
+        for image_format, items in variants.items()
+    ]
+    fallback = variants.get('JPEG') or list(variants.values())[-1]
+    src, _ = max(fallback, key=lambda item: item[1])
+    return {
+        'sources': sources,
+        'src': src,
+        'sizes': SIZES,
+        'width': width,
+        'height': height,
+    }
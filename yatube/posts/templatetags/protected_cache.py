@@ -0,0 +1,39 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from posts.caching import remember
+
+register = template.Library()
+
+
+class ProtectedCacheNode(template.Node):
+
+    def __init__(self, nodelist, timeout, name, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        key = make_template_fragment_key(
+            self.name, [var.resolve(context) for var in self.vary_on])
+        return remember(key, lambda: self.nodelist.render(context),
+                        timeout, family=self.name)
+
+
+@register.tag
+def protected_cache(parser, token):
+    """Как {% cache %}, но фрагмент пересчитывает только один запрос.
+
+        {% protected_cache timeout name [vary_on ...] %}
+    """
+    nodelist = parser.parse(('endprotected_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} ждёт как минимум два аргумента')
+    return ProtectedCacheNode(
+        nodelist, parser.compile_filter(bits[1]), bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]])
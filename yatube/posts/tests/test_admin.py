@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+
+TEXT = 'Тестовый текст'
+
+CHANGELISTS = [
+    reverse('admin:posts_post_changelist'),
+    reverse('admin:posts_comment_changelist'),
+    reverse('admin:posts_follow_changelist'),
+]
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, number):
+        start = User.objects.count()
+        for i in range(start, start + number):
+            author = User.objects.create_user(username=f'user{i}')
+            post = Post.objects.create(
+                text=TEXT, author=author, group=self.group)
+            Comment.objects.create(text=TEXT, author=author, post=post)
+            author.follower.create(author=self.admin)
+
+    def queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(context)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for url in CHANGELISTS:
+            with self.subTest(url=url):
+                self.add_rows(2)
+                few = self.queries(url)
+                self.add_rows(5)
+                self.assertEqual(self.queries(url), few)
+
+    def test_post_date_filter_queries_do_not_grow_with_rows(self):
+        url = f'{CHANGELISTS[0]}?published=week'
+        self.add_rows(2)
+        few = self.queries(url)
+        self.add_rows(5)
+        self.assertEqual(self.queries(url), few)
+        response = self.client.get(url)
+        self.assertEqual(
+            len(response.context['cl'].result_list), Post.objects.count())
+
+    def test_post_search_uses_index(self):
+        for text in ('Кошки спят', 'Кошка ест'):
+            Post.objects.create(text=text, author=self.admin)
+        response = self.client.get(CHANGELISTS[0], {'q': 'кошка'})
+        self.assertEqual(len(response.context['cl'].result_list), 2)
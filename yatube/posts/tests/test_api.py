@@ -0,0 +1,164 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.tasks import run_pending
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+from posts.settings import API_MAX_PAGE_SIZE, POSTS_ON_PAGE
+from posts.stats import reconcile
+
+USER = 'Author'
+FOLLOWER = 'Follower'
+SLUG = 'api-group'
+TEXT = 'Текст поста'
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+INDEX_URL = reverse('api_v1:index')
+EXPORT_URL = reverse('api_v1:export')
+GROUP_URL = reverse('api_v1:group_list', kwargs={'slug': SLUG})
+MISSING_GROUP_URL = reverse('api_v1:group_list', kwargs={'slug': 'missing'})
+PROFILE_URL = reverse('api_v1:profile', kwargs={'username': USER})
+FOLLOW_URL = reverse('api_v1:follow_index')
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=USER)
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+        cls.group = Group.objects.create(
+            title='Группа', slug=SLUG, description='Описание')
+        Post.objects.bulk_create(
+            Post(text=f'{TEXT} {number}', author=cls.author)
+            for number in range(POSTS_ON_PAGE + 3))
+        cls.post = Post.objects.create(
+            text=TEXT, author=cls.author, group=cls.group,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.follower, text='Комментарий')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        # bulk_create мимо сигналов: счётчики чинит reconcile.
+        reconcile()
+        run_pending()
+        cls.DETAIL_URL = reverse(
+            'api_v1:post_detail', kwargs={'post_id': cls.post.id})
+        cls.COMMENTS_URL = reverse(
+            'api_v1:post_comments', kwargs={'post_id': cls.post.id})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.reader = Client()
+        self.reader.force_login(self.follower)
+
+    def test_index_pages_with_cursor(self):
+        first = self.guest.get(INDEX_URL).json()
+        self.assertEqual(len(first['results']), POSTS_ON_PAGE)
+        self.assertIsNone(first['previous'])
+        self.assertEqual(first['results'][0], {
+            'id': self.post.id,
+            'text': TEXT,
+            'pub_date': first['results'][0]['pub_date'],
+            'updated': first['results'][0]['updated'],
+            'author': USER,
+            'group': SLUG,
+            'image': self.post.image.url,
+        })
+        second = self.guest.get(
+            INDEX_URL, {'cursor': first['next']}).json()
+        self.assertEqual(len(second['results']), 4)
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-id')
+                      .values_list('id', flat=True)))
+
+    def test_sparse_fields(self):
+        data = self.guest.get(
+            INDEX_URL, {'fields': 'text,author', 'limit': 2}).json()
+        self.assertEqual(data['results'][0], {'text': TEXT, 'author': USER})
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+        post = self.guest.get(self.DETAIL_URL, {'fields': 'id'}).json()
+        self.assertEqual(post, {'id': self.post.id})
+
+    def test_bad_parameters(self):
+        for params in ({'fields': 'id,password'}, {'limit': 0},
+                       {'limit': API_MAX_PAGE_SIZE + 1}, {'limit': 'x'}):
+            with self.subTest(params=params):
+                response = self.guest.get(INDEX_URL, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('detail', response.json())
+
+    def test_group_profile_and_comments(self):
+        group = self.guest.get(GROUP_URL).json()
+        self.assertEqual(group['group']['slug'], SLUG)
+        self.assertEqual(
+            [post['id'] for post in group['results']], [self.post.id])
+        author = self.guest.get(PROFILE_URL).json()['author']
+        self.assertEqual(author['username'], USER)
+        self.assertEqual(author['posts_count'], POSTS_ON_PAGE + 4)
+        self.assertEqual(author['followers_count'], 1)
+        comments = self.guest.get(self.COMMENTS_URL).json()
+        self.assertEqual(comments['results'][0]['text'], 'Комментарий')
+        self.assertEqual(comments['results'][0]['author'], FOLLOWER)
+
+    def test_profile_creates_missing_stats_row_once(self):
+        UserStats.objects.filter(user=self.author).delete()
+        author = self.guest.get(PROFILE_URL).json()['author']
+        self.assertEqual(author['posts_count'], POSTS_ON_PAGE + 4)
+        self.assertTrue(UserStats.objects.filter(user=self.author).exists())
+
+    def test_errors_are_json(self):
+        response = self.guest.get(MISSING_GROUP_URL)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+        self.assertEqual(self.guest.get(FOLLOW_URL).status_code, 401)
+        self.assertEqual(self.reader.post(INDEX_URL).status_code, 405)
+
+    def test_follow_feed(self):
+        data = self.reader.get(FOLLOW_URL).json()
+        self.assertEqual(data['results'][0]['id'], self.post.id)
+        self.assertEqual(len(data['results']), POSTS_ON_PAGE)
+
+    def test_conditional_requests(self):
+        response = self.guest.get(INDEX_URL)
+        self.assertEqual(self.guest.get(
+            INDEX_URL, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_export_streams_ndjson(self):
+        response = self.guest.get(
+            EXPORT_URL, {'author': USER, 'fields': 'id,group'})
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith(
+            'application/x-ndjson'))
+        rows = [json.loads(line) for line in
+                b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), POSTS_ON_PAGE + 4)
+        self.assertEqual(rows[-1], {'id': self.post.id, 'group': SLUG})
+        response = self.guest.get(EXPORT_URL, {'group': SLUG})
+        self.assertEqual(len(list(response.streaming_content)), 1)
@@ -0,0 +1,47 @@
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from posts import benchmark
+from posts.models import Follow, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_run_reports_every_page(self):
+        people = benchmark.generate(users=8, posts=30, comments=20)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertTrue(Follow.objects.exists())
+        results = benchmark.run(people, requests=2)
+        self.assertEqual(
+            set(results),
+            {'index', 'group_posts', 'profile', 'post_detail',
+             'follow_index', 'post_create'})
+        for result in results.values():
+            self.assertGreater(result['queries'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_compare_flags_regressions(self):
+        baseline = {'index': {'p95_ms': 10, 'queries': 1}}
+        self.assertEqual(
+            benchmark.compare(
+                {'index': {'p95_ms': 11, 'queries': 1}}, baseline, 0.2), [])
+        self.assertEqual(
+            benchmark.compare(
+                {'index': {'p95_ms': 13, 'queries': 2}}, baseline, 0.2),
+            ['index.p95_ms: 10 -> 13', 'index.queries: 1 -> 2'])
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
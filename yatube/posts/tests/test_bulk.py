@@ -0,0 +1,129 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.tasks import run_pending
+from posts import search
+from posts.models import (Comment, FeedEntry, Follow, Group, Post, User,
+                          UserStats)
+
+AUTHOR = 'Author'
+FOLLOWER = 'Follower'
+SLUG = 'test-slug'
+
+
+class BulkTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+        cls.directory = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def export(self, kind, name):
+        call_command('bulk_export', kind, self.path(name), stderr=StringIO())
+
+    def load(self, kind, name, **options):
+        call_command('bulk_import', kind, self.path(name),
+                     stdout=StringIO(), **options)
+
+    def test_round_trip_restores_rows_and_derived_data(self):
+        group = Group.objects.create(title='Группа', slug=SLUG)
+        posts = [Post.objects.create(text=f'Котики {index}',
+                                     author=self.author, group=group)
+                 for index in range(3)]
+        Comment.objects.create(text='Коммент', author=self.follower,
+                               post=posts[0])
+        Follow.objects.create(user=self.follower, author=self.author)
+        for kind, name in (('group', 'groups.csv'), ('post', 'posts.ndjson'),
+                           ('comment', 'comments.csv'),
+                           ('follow', 'follows.ndjson')):
+            self.export(kind, name)
+        dates = dict(Post.objects.values_list('id', 'pub_date'))
+        Follow.objects.all().delete()
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        for kind, name in (('group', 'groups.csv'), ('post', 'posts.ndjson'),
+                           ('comment', 'comments.csv'),
+                           ('follow', 'follows.ndjson')):
+            self.load(kind, name, batch_size=2)
+        run_pending()
+        self.assertEqual(
+            dict(Post.objects.values_list('id', 'pub_date')), dates)
+        self.assertEqual(Post.objects.filter(group__slug=SLUG).count(), 3)
+        self.assertEqual(Comment.objects.get().post_id, posts[0].id)
+        self.assertEqual(
+            set(FeedEntry.objects.filter(
+                user=self.follower).values_list('post_id', flat=True)),
+            set(dates))
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (3, 1))
+        self.assertEqual(
+            UserStats.objects.get(user=self.follower).following_count, 1)
+        if search.available():
+            self.assertEqual(
+                search.matching(Post.objects.all(), 'котик').count(), 3)
+
+    def test_follow_import_skips_existing_and_duplicate_rows(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        with open(self.path('follows.ndjson'), 'w') as stream:
+            stream.write(
+                f'{{"user": "{FOLLOWER}", "author": "{AUTHOR}"}}\n'
+                f'{{"user": "{AUTHOR}", "author": "{FOLLOWER}"}}\n'
+                f'{{"user": "{AUTHOR}", "author": "{FOLLOWER}"}}\n')
+        self.load('follow', 'follows.ndjson')
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assertEqual(
+            UserStats.objects.get(user=self.follower).followers_count, 1)
+
+    def test_comment_to_missing_post_aborts_import(self):
+        with open(self.path('comments.csv'), 'w') as stream:
+            stream.write(f'text,author,post\nТекст,{AUTHOR},999\n')
+        with self.assertRaisesMessage(CommandError, '999'):
+            self.load('comment', 'comments.csv')
+        self.assertFalse(Comment.objects.exists())
+
+    def test_comment_without_post_aborts_import(self):
+        with open(self.path('comments.ndjson'), 'w') as stream:
+            stream.write(f'{{"text": "Текст", "author": "{AUTHOR}"}}\n'
+                         f'{{"text": "Текст", "author": "{AUTHOR}", '
+                         f'"post": null}}\n')
+        with self.assertRaisesMessage(CommandError, 'Неверный пост'):
+            self.load('comment', 'comments.ndjson')
+        self.assertFalse(Comment.objects.exists())
+
+    def test_posts_created_after_import_with_ids_get_free_ids(self):
+        with open(self.path('posts.csv'), 'w') as stream:
+            stream.write(f'id,text,author\n500,Пост,{AUTHOR}\n')
+        self.load('post', 'posts.csv')
+        post = Post.objects.create(text='Новый', author=self.author)
+        self.assertGreater(post.id, 500)
+
+    def test_duplicate_id_names_the_row(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        with open(self.path('posts.csv'), 'w') as stream:
+            stream.write(f'id,text,author\n{post.id + 1},Новый,{AUTHOR}\n'
+                         f'{post.id},Повтор,{AUTHOR}\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            self.load('post', 'posts.csv')
+        self.assertEqual(list(Post.objects.all()), [post])
+
+    def test_unknown_author_aborts_import(self):
+        with open(self.path('posts.csv'), 'w') as stream:
+            stream.write('text,author\nТекст,nobody\n')
+        with self.assertRaises(CommandError):
+            self.load('post', 'posts.csv')
+        self.assertFalse(Post.objects.exists())
@@ -0,0 +1,48 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.metrics import registry
+from posts import caching
+
+KEY = 'feed:test'
+
+
+class RememberTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_is_computed_once(self):
+        self.assertEqual(caching.remember(KEY, self.compute, 60), 1)
+        self.assertEqual(caching.remember(KEY, self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+        self.assertGreaterEqual(
+            registry.cache_results[('feed', 'hit')], 1)
+
+    def test_expired_value_is_served_while_another_recomputes(self):
+        cache.set(KEY, ('old', 0, time.time() - 1), 60)
+        cache.add(caching.LOCK_KEY.format(KEY), 1, 60)
+        self.assertEqual(caching.remember(KEY, self.compute, 60), 'old')
+        self.assertEqual(self.calls, 0)
+        cache.delete(caching.LOCK_KEY.format(KEY))
+        self.assertEqual(caching.remember(KEY, self.compute, 60), 1)
+
+    def test_expensive_value_is_recomputed_early(self):
+        cache.set(KEY, ('old', 10, time.time() + 5), 60)
+        with mock.patch('posts.caching.random.random', return_value=0.99):
+            self.assertEqual(caching.remember(KEY, self.compute, 60), 1)
+        self.assertFalse(caching._expired(cache.get(KEY)))
+
+    @mock.patch('posts.caching.STAMPEDE_WAIT', 0)
+    def test_cold_key_is_computed_when_lock_is_stuck(self):
+        cache.add(caching.LOCK_KEY.format(KEY), 1, 60)
+        self.assertEqual(caching.remember(KEY, self.compute, 60), 1)
+        self.assertIsNone(cache.get(KEY))
@@ -0,0 +1,179 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.mail import deliver
+from core.models import OutboxEmail
+from core.tasks import run_pending
+from posts import tasks
+from posts.models import Comment, FeedEntry, Follow, Post, User, UserStats
+from posts.feed import FeedPaginator
+from posts.settings import FEED_PULL_THRESHOLD
+
+AUTHOR = 'Author'
+FOLLOWER = 'Follower'
+TEXT = 'Тестовый текст'
+
+FOLLOW_URL = reverse('posts:follow_index')
+PROFILE_FOLLOW_URL = reverse(
+    'posts:profile_follow',
+    kwargs={'username': AUTHOR}
+)
+PROFILE_UNFOLLOW_URL = reverse(
+    'posts:profile_unfollow',
+    kwargs={'username': AUTHOR}
+)
+
+
+class FeedTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+        cls.old_post = Post.objects.create(text=TEXT, author=cls.author)
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def feed(self):
+        return list(
+            self.follower_client.get(FOLLOW_URL).context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        self.follower_client.get(PROFILE_FOLLOW_URL)
+        self.assertFalse(FeedEntry.objects.exists())
+        run_pending()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.follower, post=self.old_post).exists())
+        self.assertEqual(self.feed(), [self.old_post])
+        self.follower_client.get(PROFILE_UNFOLLOW_URL)
+        self.assertFalse(FeedEntry.objects.filter(
+            user=self.follower).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_follow_and_unfollow_are_idempotent(self):
+        for _ in range(2):
+            self.follower_client.get(PROFILE_FOLLOW_URL)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1)
+        for _ in range(2):
+            response = self.follower_client.get(PROFILE_UNFOLLOW_URL)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_duplicate_follow_is_rejected_by_database(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.follower, author=self.author)
+
+    def test_fan_out_loads_post_in_one_query(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        run_pending()
+        with CaptureQueriesContext(connection) as queries:
+            tasks.fan_out(self.old_post.id)
+        self.assertEqual(sum(
+            'FROM "posts_post"' in query['sql']
+            for query in queries.captured_queries), 1)
+
+    def test_new_post_fans_out(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text=TEXT, author=self.author)
+        run_pending()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.follower, post=post).exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    @mock.patch('posts.feed.FEED_PULL_THRESHOLD', 0)
+    def test_prolific_author_is_pulled(self):
+        follow = Follow.objects.create(
+            user=self.follower, author=self.author)
+        run_pending()
+        follow.refresh_from_db()
+        self.assertFalse(follow.materialized)
+        post = Post.objects.create(text=TEXT, author=self.author)
+        run_pending()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed(), [post, self.old_post])
+
+    def test_prolific_author_is_recognised_by_counter(self):
+        UserStats.objects.filter(user=self.author).update(
+            posts_count=FEED_PULL_THRESHOLD + 1)
+        follow = Follow.objects.create(
+            user=self.follower, author=self.author)
+        run_pending()
+        follow.refresh_from_db()
+        self.assertFalse(follow.materialized)
+
+    def test_feed_pages_merge_entries_and_pulled_posts(self):
+        prolific = User.objects.create_user(username='Prolific')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.follower, author=prolific)
+        for number in range(3):
+            Post.objects.create(text=TEXT, author=prolific)
+            Post.objects.create(text=TEXT, author=self.author)
+        run_pending()
+        Follow.objects.filter(author=prolific).update(materialized=False)
+        FeedEntry.objects.filter(author=prolific).delete()
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        self.assertEqual(FeedEntry.objects.filter(
+            user=self.follower).count(), 4)
+        paginator = FeedPaginator(self.follower, Post.objects.all(), 3)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([post for page in pages for post in page], expected)
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(back), expected[3:6])
+        self.assertTrue(back.has_previous())
+
+    @override_settings(
+        OUTBOX_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_notifications_are_coalesced_into_digests(self):
+        User.objects.filter(pk=self.author.pk).update(
+            email='author@example.com')
+        User.objects.filter(pk=self.follower.pk).update(
+            email='follower@example.com')
+        self.follower_client.get(PROFILE_FOLLOW_URL)
+        for author in (self.follower, self.follower, self.author):
+            Comment.objects.create(
+                text=TEXT, author=author, post=self.old_post)
+        Post.objects.create(text=TEXT, author=self.author)
+        # Уведомление о old_post тоже ещё в очереди и застаёт подписку.
+        run_pending()
+        self.assertEqual(OutboxEmail.objects.count(), 5)
+        self.assertEqual(deliver(), 0)
+        OutboxEmail.objects.update(created=timezone.now() - timedelta(
+            seconds=settings.OUTBOX_DIGEST_WINDOW))
+        self.assertEqual(deliver(), 3)
+        messages = {(message.to[0], message.subject): message.body
+                    for message in mail.outbox}
+        self.assertEqual(set(messages), {
+            ('author@example.com', tasks.COMMENTS_SUBJECT),
+            ('author@example.com', tasks.FOLLOWERS_SUBJECT),
+            ('follower@example.com', tasks.NEW_POSTS_SUBJECT),
+        })
+        self.assertEqual(messages[
+            'author@example.com', tasks.COMMENTS_SUBJECT].count(FOLLOWER), 2)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_rebuild_feeds(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(self.feed(), [self.old_post])
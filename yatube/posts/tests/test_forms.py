@@ -1,13 +1,20 @@
+import io
+import os
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.defaultfilters import filesizeformat
 from django.test import Client, TestCase
 from django.test.utils import override_settings
 from django.urls import reverse
+from PIL import Image
 
+from posts import uploads
 from posts.forms import PostForm
 from posts.models import Group, Post, User, Comment
 
@@ -31,6 +38,8 @@ SMALL_GIF = (
     b'\x0A\x00\x3B'
 )
 COMMENT_TEXT = 'Коммент'
+IMAGE_NAME = 'posts/' + uploads.process_image(
+    SimpleUploadedFile('small.gif', SMALL_GIF)).name
 
 CREATE_URL = reverse('posts:post_create')
 PROFILE_URL = reverse('posts:profile', kwargs={'username': AUTHOR})
@@ -109,7 +118,7 @@ class PostsFormsTests(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.author, self.post_author)
         self.assertEqual(post.group.id, form_data['group'])
-        self.assertEqual(post.image, 'posts/small.gif')
+        self.assertEqual(post.image, IMAGE_NAME)
 
     def test_edit_post(self):
         uploaded = SimpleUploadedFile(
@@ -136,7 +145,56 @@ class PostsFormsTests(TestCase):
         self.assertEqual(edited_post.text, form_data['text'])
         self.assertEqual(edited_post.author, self.post.author)
         self.assertEqual(edited_post.group.id, form_data['group'])
-        self.assertEqual(edited_post.image, 'posts/sml.gif')
+        self.assertEqual(edited_post.image, IMAGE_NAME)
+
+    def test_identical_uploads_share_one_file(self):
+        for name in ['one.gif', 'two.gif']:
+            self.author.post(CREATE_URL, data={
+                'text': TEXT2,
+                'image': SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+            })
+        self.assertEqual(
+            Post.objects.filter(image=IMAGE_NAME).count(), 2)
+        self.assertEqual(os.listdir(os.path.join(
+            TEMP_MEDIA_ROOT, 'posts')).count(IMAGE_NAME[6:]), 1)
+
+    def test_concurrent_identical_save_does_not_loop(self):
+        storage = uploads.ContentAddressedStorage(location=TEMP_MEDIA_ROOT)
+        name = storage.save('race/same.gif', ContentFile(SMALL_GIF))
+        # Обе загрузки прошли проверку exists(), пока файла ещё не было.
+        with mock.patch('os.path.exists', return_value=False):
+            self.assertEqual(
+                storage.save('race/same.gif', ContentFile(SMALL_GIF)), name)
+        self.assertEqual(
+            os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'race')), ['same.gif'])
+        with storage.open(name) as stored:
+            self.assertEqual(stored.read(), SMALL_GIF)
+
+    def test_big_image_is_downscaled_without_exif(self):
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        Image.new('RGB', (4000, 1000)).save(buffer, 'JPEG', exif=exif)
+        self.author.post(CREATE_URL, data={
+            'text': TEXT2,
+            'image': SimpleUploadedFile(
+                'big.jpg', buffer.getvalue(), 'image/jpeg'),
+        })
+        post = Post.objects.get(text=TEXT2)
+        with Image.open(post.image.path) as image:
+            self.assertLessEqual(max(image.size), 1920)
+            self.assertFalse(image.getexif())
+
+    @mock.patch('posts.uploads.POST_IMAGE_MAX_UPLOAD_SIZE', 10)
+    @mock.patch('posts.forms.POST_IMAGE_MAX_UPLOAD_SIZE', 10)
+    def test_oversized_upload_is_rejected(self):
+        response = self.author.post(CREATE_URL, data={
+            'text': TEXT2,
+            'image': SimpleUploadedFile('big.gif', SMALL_GIF, 'image/gif'),
+        })
+        self.assertFormError(
+            response, 'form', 'image', f'Файл больше {filesizeformat(10)}.')
+        self.assertFalse(Post.objects.filter(text=TEXT2).exists())
 
     def test_post_create_edit_pages_show_correct_context(self):
         urls = [
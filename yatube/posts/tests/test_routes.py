@@ -17,7 +17,9 @@ class PostsRoutesTest(TestCase):
             [f'/posts/{POST_ID}/', 'post_detail', [POST_ID]],
             [f'/posts/{POST_ID}/edit/', 'post_edit', [POST_ID]],
             [f'/posts/{POST_ID}/comment/', 'add_comment', [POST_ID]],
+            [f'/posts/{POST_ID}/comments/', 'post_comments', [POST_ID]],
             ['/follow/', 'follow_index', []],
+            ['/search/', 'search', []],
             [f'/profile/{USERNAME}/follow/', 'profile_follow', [USERNAME]],
             [f'/profile/{USERNAME}/unfollow/', 'profile_unfollow', [USERNAME]],
         ]
@@ -0,0 +1,59 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Follow, Post, User, UserStats
+
+TEXT = 'Тестовый текст'
+
+
+class UserStatsTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.follower = User.objects.create_user(username='Follower')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(text=TEXT, author=self.author)
+        Post.objects.create(text=TEXT, author=self.author)
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.follower).following_count, 1)
+        post.delete()
+        follow.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.follower).following_count, 0)
+
+    def test_reconcile_stats(self):
+        Post.objects.create(text=TEXT, author=self.author)
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        call_command('reconcile_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_new_author_is_counted_without_profile_visit(self):
+        user = User.objects.create_user(username='Newcomer')
+        post = Post.objects.create(text=TEXT, author=user)
+        Post.objects.create(text=TEXT, author=user)
+        self.assertEqual(self.stats(user).posts_count, 2)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertEqual(response.context['post'].author_posts_count, 2)
+
+    def test_delete_user_with_posts_and_follows(self):
+        user = User.objects.create_user(username='Leaving')
+        Post.objects.create(text=TEXT, author=user)
+        Follow.objects.create(user=user, author=self.author)
+        Follow.objects.create(user=self.follower, author=user)
+        user.delete()
+        self.assertFalse(UserStats.objects.filter(user_id=user.id).exists())
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.follower).following_count, 0)
@@ -1,16 +1,23 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.shortcuts import get_object_or_404
 from django.test import Client, TestCase
 from django.test.utils import override_settings
 from django.urls import reverse
+from django.utils import timezone
 
+from core.routers import PIN_COOKIE
+from core.tasks import run_pending
+from posts import thumbnails
 from posts.models import Comment, Follow, Group, Post, User
-from posts.settings import POSTS_ON_PAGE
+from posts.paginator import NEXT, encode_cursor
+from posts.settings import COMMENTS_ON_PAGE, POSTS_ON_PAGE
 
 SLUG1 = 'test-slug-1'
 SLUG2 = 'test-slug-2'
@@ -34,6 +41,7 @@ SMALL_GIF = (
 )
 
 INDEX_URL = reverse('posts:index')
+API_INDEX_URL = reverse('api_v1:index')
 PROFILE_URL = reverse('posts:profile', kwargs={'username': USER})
 GROUP_URL = reverse('posts:group_list', kwargs={'slug': SLUG1})
 OTHER_GROUP_URL = reverse('posts:group_list', kwargs={'slug': SLUG2})
@@ -101,6 +109,7 @@ class PostsViewsTests(TestCase):
 
     def test_pages_show_correct_contexts(self):
         Follow.objects.create(user=self.follower, author=self.user)
+        run_pending()
         urls = [
             INDEX_URL,
             GROUP_URL,
@@ -150,15 +159,68 @@ class PostsViewsTests(TestCase):
         self.assertEqual(comment.author, self.comment.author)
         self.assertEqual(comment.post, self.comment.post)
 
+    def test_comments_are_paginated(self):
+        Comment.objects.bulk_create(
+            Comment(text=f'{COMMENT_TEXT} {i}', author=self.user,
+                    post=self.post)
+            for i in range(COMMENTS_ON_PAGE))
+        comments = self.guest.get(self.DETAIL_URL).context['comments']
+        self.assertEqual(len(comments), COMMENTS_ON_PAGE)
+        self.assertTrue(comments.has_next())
+        data = self.guest.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': comments.next_cursor}).json()
+        self.assertIn(COMMENT_TEXT, data['html'])
+        self.assertIsNone(data['next_cursor'])
+
     def test_cache(self):
-        response1 = self.authorized_client.get(INDEX_URL)
+        response1 = self.guest.get(INDEX_URL)
+        with self.assertNumQueries(0):
+            response2 = self.guest.get(INDEX_URL)
         Post.objects.all().delete()
-        response2 = self.authorized_client.get(INDEX_URL)
-        cache.clear()
-        response3 = self.authorized_client.get(INDEX_URL)
+        response3 = self.guest.get(INDEX_URL)
         self.assertEqual(response2.content, response1.content)
         self.assertNotEqual(response3.content, response2.content)
 
+    @override_settings(REPLICAS=['default'])
+    def test_replica_render_is_not_served_to_pinned_users(self):
+        self.guest.get(INDEX_URL)
+        # Запись, которую реплика ещё не видела: поколение то же.
+        Post.objects.filter(id=self.post.id).update(
+            text=TEXT_4, updated=timezone.now())
+        self.assertNotContains(self.guest.get(INDEX_URL), TEXT_4)
+        self.guest.cookies[PIN_COOKIE] = '1'
+        self.assertContains(self.guest.get(INDEX_URL), TEXT_4)
+
+    def test_cached_index_keeps_user_chrome(self):
+        self.guest.get(INDEX_URL)
+        response = self.authorized_client.get(INDEX_URL)
+        self.assertContains(response, self.post.text)
+        self.assertContains(response, reverse('users:logout'))
+
+    def test_post_card_cache(self):
+        self.guest.get(PROFILE_URL)
+        Post.objects.filter(id=self.post.id).update(text=TEXT_2)
+        self.assertNotContains(self.guest.get(PROFILE_URL), TEXT_2)
+        group = Group.objects.get(id=self.group.id)
+        group.title = TEXT_3
+        group.save()
+        response = self.guest.get(PROFILE_URL)
+        self.assertContains(response, TEXT_3)
+        self.assertContains(response, TEXT_2)
+
+    def test_picture_falls_back_until_generated(self):
+        self.assertContains(
+            self.guest.get(self.DETAIL_URL), self.post.image.url)
+        thumbnails.generate(self.post.id)
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual(list(post.variants), thumbnails.formats())
+        response = self.guest.get(self.DETAIL_URL)
+        for items in post.variants.values():
+            for url, width in items:
+                self.assertContains(response, f'{url} {width}w')
+        self.assertNotContains(response, self.post.image.url)
+
     def test_follow_not_on_page(self):
         self.assertNotIn(
             self.post,
@@ -218,3 +280,239 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(page=page):
                 response = self.guest.get(page)
                 self.assertEqual(len(response.context['page_obj']), records)
+
+    def test_cursor_paginators(self):
+        for url in [INDEX_URL, GROUP_URL, PROFILE_URL]:
+            with self.subTest(url=url):
+                first = self.guest.get(url).context['page_obj']
+                self.assertEqual(len(first), POSTS_ON_PAGE)
+                self.assertFalse(first.has_previous())
+                second = self.guest.get(
+                    url, {'cursor': first.next_cursor}).context['page_obj']
+                self.assertEqual(
+                    len(second), self.POSTS_NUM - POSTS_ON_PAGE)
+                self.assertFalse(second.has_next())
+                self.assertTrue(
+                    {post.id for post in first}.isdisjoint(
+                        post.id for post in second))
+                back = self.guest.get(
+                    url,
+                    {'cursor': second.previous_cursor}).context['page_obj']
+                self.assertEqual(
+                    [post.id for post in back], [post.id for post in first])
+
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.guest.get(INDEX_URL, {'cursor': 'broken'})
+        self.assertEqual(
+            len(response.context['page_obj']), POSTS_ON_PAGE)
+
+    def test_tampered_cursor_shows_first_page(self):
+        date = '2021-01-01T00:00:00+00:00'
+        cursors = [
+            encode_cursor(NEXT, ['2021-02-30T00:00:00+00:00', 1]),
+            encode_cursor(NEXT, ['2021-01-01T00:00:00', 1]),
+            encode_cursor(NEXT, [date, 'abc']),
+            encode_cursor(NEXT, [date, True]),
+            encode_cursor(NEXT, [date, 10 ** 30]),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.guest.get(INDEX_URL, {'cursor': cursor})
+                self.assertEqual(
+                    len(response.context['page_obj']), POSTS_ON_PAGE)
+                self.assertEqual(self.guest.get(
+                    API_INDEX_URL, {'cursor': cursor}).status_code, 200)
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        cls.follower = User.objects.create_user(username=FOLLOWER)
+        cls.group = Group.objects.create(
+            title=TITLE,
+            slug=SLUG1,
+            description=DESCRIPTION
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        for i in range(POSTS_ON_PAGE + 3):
+            Post.objects.create(
+                text=f'{TEXT} {i}',
+                author=cls.user,
+                group=cls.group)
+        run_pending()
+        cls.post = Post.objects.first()
+        for user in [cls.user, cls.follower]:
+            Comment.objects.create(
+                text=COMMENT_TEXT, author=user, post=cls.post)
+        cls.DETAIL_URL = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': cls.post.id})
+        cls.COMMENTS_URL = reverse(
+            'posts:post_comments',
+            kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        self.guest = Client()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+        cache.clear()
+
+    def test_listing_query_counts(self):
+        # Первый запрос к странице ещё и считает её метку для ETag.
+        cases = [
+            [INDEX_URL, self.guest, 2],
+            [GROUP_URL, self.guest, 3],
+            [PROFILE_URL, self.guest, 3],
+            [self.DETAIL_URL, self.guest, 3],
+            [self.COMMENTS_URL, self.guest, 2],
+            [FOLLOW_URL, self.follower_client, 5],
+        ]
+        for url, client, queries in cases:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    client.get(url)
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        cls.cats = Post.objects.create(
+            text='Кошки любят спать на тёплых батареях', author=cls.user)
+        cls.dogs = Post.objects.create(
+            text='Собака бегала по двору', author=cls.user)
+        cls.SEARCH_URL = reverse('posts:search')
+
+    def setUp(self):
+        self.guest = Client()
+
+    def search(self, query, **params):
+        response = self.guest.get(self.SEARCH_URL, {'q': query, **params})
+        return response.context['page_obj']
+
+    def test_search_matches_word_forms(self):
+        self.assertEqual(list(self.search('кошка')), [self.cats])
+        self.assertEqual(list(self.search('собаки бегают')), [self.dogs])
+        self.assertEqual(list(self.search('попугай')), [])
+
+    def test_search_follows_edits_and_deletes(self):
+        dogs = Post.objects.get(id=self.dogs.id)
+        dogs.text = 'Попугай сидел на жёрдочке'
+        dogs.save()
+        self.assertEqual(list(self.search('попугаи')), [dogs])
+        dogs.delete()
+        self.assertEqual(list(self.search('попугаи')), [])
+
+    def test_tampered_search_cursor_shows_first_page(self):
+        for values in ([0.5, 10 ** 30], [0.5, 'abc'], ['x', 1]):
+            with self.subTest(values=values):
+                page = self.search(
+                    'кошка', cursor=encode_cursor(NEXT, values))
+                self.assertEqual(list(page), [self.cats])
+
+    def test_search_cursor(self):
+        Post.objects.bulk_create(
+            Post(text=f'Кошка {i}', author=self.user)
+            for i in range(POSTS_ON_PAGE))
+        call_command('rebuild_search_index', stdout=StringIO())
+        first = self.search('кошки')
+        self.assertEqual(len(first), POSTS_ON_PAGE)
+        second = self.search('кошки', cursor=first.next_cursor)
+        self.assertEqual(len(second), 1)
+        self.assertTrue(
+            {post.id for post in first}.isdisjoint(
+                post.id for post in second))
+
+
+class ConditionalRequestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        cls.reader = User.objects.create_user(username=FOLLOWER)
+        cls.group = Group.objects.create(
+            title=TITLE, slug=SLUG1, description=DESCRIPTION)
+        cls.post = Post.objects.create(
+            text=TEXT, author=cls.user, group=cls.group)
+        cls.DETAIL_URL = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_pages_are_not_modified_without_queries(self):
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL, self.DETAIL_URL):
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                with self.assertNumQueries(0):
+                    repeat = self.guest.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(repeat.status_code, 304)
+                repeat = self.guest.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(repeat.status_code, 304)
+
+    def test_changes_invalidate_only_affected_pages(self):
+        Group.objects.create(
+            title=TITLE, slug=SLUG2, description=DESCRIPTION)
+        etags = {url: self.guest.get(url)['ETag']
+                 for url in (INDEX_URL, GROUP_URL, OTHER_GROUP_URL)}
+        Post.objects.create(text=TEXT_2, author=self.user, group=self.group)
+        for url, changed in ((INDEX_URL, True), (GROUP_URL, True),
+                             (OTHER_GROUP_URL, False)):
+            with self.subTest(url=url):
+                status = self.guest.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]).status_code
+                self.assertEqual(status, 200 if changed else 304)
+
+    def test_write_keeps_stamps_of_other_pages(self):
+        other = Group.objects.create(
+            title=TITLE, slug=SLUG2, description=DESCRIPTION)
+        etag = self.guest.get(OTHER_GROUP_URL)['ETag']
+        Post.objects.create(text=TEXT_2, author=self.reader, group=self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.guest.get(
+                OTHER_GROUP_URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        etag = self.guest.get(GROUP_URL)['ETag']
+        self.post.group = other
+        self.post.save()
+        self.assertEqual(self.guest.get(
+            GROUP_URL, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_comment_deletion_and_follow_change_etags(self):
+        comment = Comment.objects.create(
+            text=COMMENT_TEXT, author=self.reader, post=self.post)
+        etag = self.guest.get(self.DETAIL_URL)['ETag']
+        comment.delete()
+        self.assertEqual(self.guest.get(
+            self.DETAIL_URL, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.reader_client.get(PROFILE_URL)['ETag']
+        self.reader_client.get(PROFILE_FOLLOW_URL)
+        self.assertEqual(self.reader_client.get(
+            PROFILE_URL, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_logged_in_users_get_own_etag_and_no_last_modified(self):
+        guest = self.guest.get(INDEX_URL)
+        reader = self.reader_client.get(INDEX_URL)
+        self.assertNotEqual(guest['ETag'], reader['ETag'])
+        self.assertFalse(reader.has_header('Last-Modified'))
+        self.assertEqual(self.revalidate(self.reader_client, INDEX_URL), 304)
+
+    def test_new_login_does_not_revalidate_stale_csrf_form(self):
+        response = self.reader_client.get(self.DETAIL_URL)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.reader_client.logout()
+        self.reader_client.force_login(self.reader)
+        self.assertEqual(self.reader_client.get(
+            self.DETAIL_URL,
+            HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
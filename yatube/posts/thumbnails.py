@@ -0,0 +1,80 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from PIL import features
+from sorl.thumbnail import get_thumbnail
+
+from core import tasks
+from . import caching, validators
+from .models import Post
+from .settings import (POST_IMAGE_FORMATS, POST_IMAGE_SIZE,
+                       POST_IMAGE_WIDTHS, POST_THUMBNAIL_OPTIONS,
+                       THUMBNAIL_ASYNC)
+
+SCHEDULED_KEY = 'thumbnails:scheduled:{}'
+
+
+def formats():
+    """Форматы из настроек, которые умеет кодировать установленный Pillow."""
+    return [
+        image_format for image_format in POST_IMAGE_FORMATS
+        if image_format != 'WEBP' or features.check('webp')
+    ]
+
+
+def build_variants(image):
+    """Строит все размеры и форматы картинки; возвращает их описание."""
+    full_width, full_height = POST_IMAGE_SIZE
+    variants = []
+    for image_format in formats():
+        for width in POST_IMAGE_WIDTHS:
+            height = round(width * full_height / full_width)
+            thumbnail = get_thumbnail(
+                image, f'{width}x{height}',
+                format=image_format, **POST_THUMBNAIL_OPTIONS)
+            variants.append({
+                'name': thumbnail.name,
+                'width': width,
+                'height': height,
+                'format': image_format,
+            })
+    return variants
+
+
+def generate(post_id):
+    """Строит варианты картинки поста и сбрасывает кеш его карточки."""
+    try:
+        post = Post.objects.only(
+            'id', 'image', 'author_id', 'group_id').get(pk=post_id)
+    except Post.DoesNotExist:
+        return
+    if post.image:
+        variants = build_variants(post.image)
+        Post.objects.filter(pk=post_id, image=post.image.name).update(
+            image_variants=json.dumps(variants),
+            updated=timezone.now())
+        caching.bump(caching.POSTS)
+        validators.post_changed(post)
+
+
+def schedule(post_id):
+    """Ставит построение миниатюр в очередь задач."""
+    if THUMBNAIL_ASYNC:
+        tasks.enqueue('posts.thumbnails', post_id,
+                      dedup_key=f'thumbnails:{post_id}')
+    else:
+        transaction.on_commit(lambda: generate(post_id))
+
+
+def schedule_once(post_id):
+    """schedule для показа карточки: не чаще раза за срок аренды задачи.
+
+    Карточка без миниатюр зовёт это на каждом показе, а ключ в кеше
+    дешевле записи в очередь.
+    """
+    if cache.add(SCHEDULED_KEY.format(post_id), True,
+                 settings.TASK_VISIBILITY_TIMEOUT):
+        schedule(post_id)
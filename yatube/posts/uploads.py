@@ -0,0 +1,126 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.utils.deconstruct import deconstructible
+from PIL import Image, ImageOps
+
+from .settings import (POST_IMAGE_JPEG_QUALITY, POST_IMAGE_MAX_PIXELS,
+                       POST_IMAGE_MAX_SIDE, POST_IMAGE_MAX_UPLOAD_SIZE)
+
+EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+
+class RejectedUpload(InMemoryUploadedFile):
+    """Заглушка вместо файла, оборванного на середине загрузки."""
+
+    def __init__(self, field_name, name, content_type, size):
+        super().__init__(io.BytesIO(), field_name, name, content_type, 0,
+                         None)
+        self.received_size = size
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """Прекращает принимать файл, как только он превысил лимит.
+
+    Стоит первым в FILE_UPLOAD_HANDLERS: после превышения чанки не
+    доходят до следующих обработчиков, а вместо файла в форму
+    попадает RejectedUpload.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.rejected = True
+        if self.rejected:
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not self.rejected:
+            return None
+        return RejectedUpload(self.field_name, self.file_name,
+                              self.content_type, self.received)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — хеш содержимого: дубликаты не пишутся."""
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        """Пишет во временный файл рядом и ставит его на место ссылкой.
+
+        Читатель не увидит недописанный файл. Если две одинаковые
+        загрузки придут одновременно, os.link второй упадёт с
+        FileExistsError — это успех: под этим именем то же содержимое.
+        """
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name.replace('\\', '/')
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as temp:
+                for chunk in content.chunks():
+                    temp.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            try:
+                os.link(temp_path, full_path)
+            except FileExistsError:
+                pass
+        finally:
+            os.remove(temp_path)
+        return name.replace('\\', '/')
+
+
+def check_dimensions(image):
+    width, height = image.size
+    return width * height <= POST_IMAGE_MAX_PIXELS
+
+
+def process_image(upload):
+    """Уменьшает картинку, убирает EXIF и называет файл по хешу.
+
+    Анимированные картинки сохраняются как есть, чтобы не потерять кадры.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    image_format = image.format
+    if getattr(image, 'is_animated', False) or image_format not in EXTENSIONS:
+        upload.seek(0)
+        content = b''.join(upload.chunks())
+    else:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((POST_IMAGE_MAX_SIDE, POST_IMAGE_MAX_SIDE))
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        options = {'optimize': True}
+        if image_format in ('JPEG', 'WEBP'):
+            options['quality'] = POST_IMAGE_JPEG_QUALITY
+        image.save(buffer, image_format, **options)
+        content = buffer.getvalue()
+    digest = hashlib.sha256(content).hexdigest()
+    extension = (EXTENSIONS.get(image_format)
+                 or os.path.splitext(upload.name)[1].lstrip('.').lower())
+    return ContentFile(content, name=f'{digest}.{extension}')
@@ -0,0 +1,188 @@
+"""Валидаторы условных запросов: ETag и Last-Modified без рендера.
+
+Метка страницы — самое позднее изменение показанных на ней данных.
+Она кешируется под версиями своих областей: запись сдвигает версии
+только тех страниц, где видна, так что остальные метки не
+пересчитываются. Пересчёт — выборка по индексам на updated. Удаления и
+подписки не оставляют дат в таблицах, поэтому их время хранится в
+кеше отдельно.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from core.routers import replica_allowed
+from .caching import bump, generation, remember
+from .models import Comment, Group, Post, User
+from .settings import VALIDATOR_TIMEOUT
+
+CHANGED_KEY = 'changed:{}'
+SCOPE_KEY = 'validator:{}'
+POST_AUTHOR_KEY = 'post-author:{}'
+DELETIONS = 'deletions'
+FOLLOWS = 'follows'
+# Область всех страниц: её сдвигают правки групп и массовый импорт.
+ALL = 'all'
+INDEX = 'index'
+
+
+def touch(name):
+    """Запоминает время изменения, не оставившего даты в таблицах."""
+    cache.set(CHANGED_KEY.format(name), timezone.now(), None)
+
+
+def changed(name):
+    key = CHANGED_KEY.format(name)
+    value = cache.get(key)
+    if value is None:
+        # Время потеряно вместе с кешем: считаем, что изменилось сейчас.
+        cache.add(key, timezone.now(), None)
+        value = cache.get(key)
+    return value
+
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def invalidate(*scopes):
+    """Сдвигает версии областей: их метки пересчитаются при запросе."""
+    for scope in scopes:
+        bump(SCOPE_KEY.format(scope))
+
+
+def post_changed(post, group_ids=()):
+    """Сбрасывает метки страниц, на которых виден пост.
+
+    group_ids — группы, где пост был до правки: их страницы тоже
+    изменились. Уход поста из группы даты ей не оставляет, поэтому
+    считается удалением.
+    """
+    if set(group_ids) - {post.group_id, None}:
+        touch(DELETIONS)
+    group_ids = {post.group_id, *group_ids} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True) if group_ids else ()
+    invalidate(INDEX, f'author:{post.author_id}',
+               f'profile:{post.author.username}',
+               *(f'group:{slug}' for slug in slugs))
+
+
+def _stamp(scopes, compute):
+    # Реплика может отставать, поэтому её метки кешируются отдельно.
+    source = 'replica' if replica_allowed() else 'primary'
+    versions = ':'.join(
+        str(generation(SCOPE_KEY.format(scope))) for scope in (*scopes, ALL))
+    return remember(
+        f'validator:{scopes[0]}:{source}:{versions}',
+        lambda: latest(*compute().values()),
+        VALIDATOR_TIMEOUT, family='validator')
+
+
+def _latest_of(queryset, field):
+    return Subquery(queryset.order_by(f'-{field}').values(field)[:1])
+
+
+def _latest_group():
+    return _latest_of(Group.objects.all(), 'updated')
+
+
+def index_stamp():
+    stamp = _stamp((INDEX,), lambda: Post.objects.order_by(
+        '-updated').annotate(groups_latest=_latest_group()).values(
+            'updated', 'groups_latest').first() or {})
+    return latest(changed(DELETIONS), stamp)
+
+
+def group_stamp(slug):
+    stamp = _stamp((f'group:{slug}',), lambda: Group.objects.filter(
+        slug=slug).annotate(posts_latest=_latest_of(
+            Post.objects.filter(group=OuterRef('pk')), 'updated'),
+    ).values('updated', 'posts_latest').first() or {})
+    return stamp and latest(stamp, changed(DELETIONS))
+
+
+def profile_stamp(username):
+    stamp = _stamp((f'profile:{username}',), lambda: User.objects.filter(
+        username=username).annotate(
+            posts_latest=_latest_of(
+                Post.objects.filter(author=OuterRef('pk')), 'updated'),
+            groups_latest=_latest_group(),
+    ).values('date_joined', 'posts_latest', 'groups_latest').first() or {})
+    return stamp and latest(stamp, changed(DELETIONS), changed(FOLLOWS))
+
+
+def post_stamp(post_id):
+    author_key = POST_AUTHOR_KEY.format(post_id)
+
+    def compute():
+        # Карточка показывает число постов автора, поэтому важны и они.
+        row = Post.objects.filter(pk=post_id).annotate(
+            author_latest=_latest_of(
+                Post.objects.filter(author=OuterRef('author')), 'updated'),
+            comment_latest=_latest_of(
+                Comment.objects.filter(post=OuterRef('pk')), 'pub_date'),
+        ).values(
+            'author_id', 'updated', 'group__updated', 'author_latest',
+            'comment_latest'
+        ).first() or {}
+        if row:
+            # Автор у поста не меняется: связь кешируется бессрочно.
+            cache.set(author_key, row.pop('author_id'), None)
+        return row
+
+    # Метку сдвигают и посты автора, а его находит тот же запрос.
+    known = None
+    author_id = cache.get(author_key)
+    if author_id is None:
+        known = compute()
+        if not known:
+            return None
+        author_id = cache.get(author_key)
+    stamp = _stamp((f'post:{post_id}', f'author:{author_id}'),
+                   lambda: compute() if known is None else known)
+    return stamp and latest(stamp, changed(DELETIONS))
+
+
+def conditional(stamp):
+    """condition() с меткой stamp(**kwargs представления).
+
+    В ETag входит пользователь: шапка страницы у каждого своя. По той же
+    причине Last-Modified отдаётся только анонимам — If-Modified-Since
+    не различает, кто спрашивает. Вошедшим в ETag подмешивается и
+    секрет CSRF: формы страницы несут выведенный из него токен, а после
+    нового входа секрет другой и сохранённая копия формы не пройдёт
+    проверку. Секрет заводится заранее, до рендера, иначе первая
+    страница получила бы ETag без него.
+    """
+    def modified(request, **kwargs):
+        if not hasattr(request, '_page_stamp'):
+            request._page_stamp = stamp(**kwargs)
+        return request._page_stamp
+
+    def last_modified(request, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return modified(request, **kwargs)
+
+    def etag(request, **kwargs):
+        value = modified(request, **kwargs)
+        if value is None:
+            return None
+        version = settings.CACHES['default'].get('VERSION', 1)
+        secret = ''
+        if request.user.is_authenticated:
+            get_token(request)
+            secret = request.META['CSRF_COOKIE']
+        return hashlib.md5(
+            f'{value.isoformat()}:{request.user.pk}:{secret}:{version}'
+            .encode()
+        ).hexdigest()
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -1,11 +1,25 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
+from django.template.loader import render_to_string
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
+
+from core.routers import pin_to_primary, read_from_replica, replica_allowed
+from .caching import generation
+from .feed import FeedPaginator, follow_posts
+from .follows import follow, unfollow
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .settings import POSTS_ON_PAGE
+from .models import Comment, Follow, Group, Post, User
+from .paginator import CursorPaginator
+from .search import search_page
+from .stats import for_user
+from .validators import (conditional, group_stamp, index_stamp, post_stamp,
+                         profile_stamp)
+from .settings import (COMMENTS_ON_PAGE, INDEX_CACHE_TIMEOUT, POSTS_ON_PAGE,
+                       REPLICA_CACHE_TIMEOUT)
 
 INDEX_HTML = 'posts/index.html'
 GROUP_HTML = 'posts/group_list.html'
@@ -13,23 +27,43 @@ PROFILE_HTML = 'posts/profile.html'
 DETAIL_HTML = 'posts/post_detail.html'
 CREATE_HTML = 'posts/create_post.html'
 FOLLOW_INDEX_HTML = 'posts/follow.html'
+SEARCH_HTML = 'posts/search.html'
+COMMENT_LIST_HTML = 'posts/includes/comment_list.html'
 
 
 def page_obj(request, model):
-    post_list = model.all()
-    paginator = Paginator(post_list, POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    post_list = model.all().for_listing()
+    if 'page' in request.GET:
+        paginator = Paginator(post_list, POSTS_ON_PAGE)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CursorPaginator(post_list, POSTS_ON_PAGE)
+    return paginator.get_page(request.GET.get('cursor'))
 
 
-@cache_page(20, key_prefix='index_page')
+@read_from_replica
+@conditional(index_stamp)
 def index(request):
+    replica = replica_allowed() and bool(settings.REPLICAS)
     return render(request, INDEX_HTML, {
-        'page_obj': page_obj(request, Post.objects),
+        'page_obj': SimpleLazyObject(lambda: page_obj(request, Post.objects)),
+        # Снятая с отстающей реплики лента не должна достаться тем, кто
+        # после записи читает с основной базы.
+        'feed_key': [
+            generation(),
+            'replica' if replica else 'primary',
+            request.GET.get('cursor'),
+            request.GET.get('page'),
+        ],
+        # Реплика может отставать: снятую с неё ленту держим недолго,
+        # иначе она переживёт следующую запись.
+        'cache_timeout': (REPLICA_CACHE_TIMEOUT if replica
+                          else INDEX_CACHE_TIMEOUT),
         'index': True
     })
 
 
+@read_from_replica
+@conditional(group_stamp)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, GROUP_HTML, {
@@ -38,26 +72,65 @@ def group_posts(request, slug):
     })
 
 
+@read_from_replica
+@conditional(profile_stamp)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
     following = (request.user.is_authenticated and request.user != author
                  and Follow.objects.filter(user=request.user,
                                            author=author).exists())
     return render(request, PROFILE_HTML, {
         'page_obj': page_obj(request, author.posts),
         'author': author,
+        'stats': for_user(author),
         'following': following,
     })
 
 
+def comments_page(request, post_id, cursor_param='cursor'):
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).for_listing(),
+        COMMENTS_ON_PAGE)
+    return paginator.get_page(request.GET.get(cursor_param))
+
+
+@read_from_replica
+@conditional(post_stamp)
 def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.for_listing().with_author_posts_count(),
+        id=post_id)
     return render(request, DETAIL_HTML, {
-        'post': get_object_or_404(Post, id=post_id),
+        'post': post,
+        'comments': comments_page(request, post.id, 'comments'),
         'form': CommentForm(request.POST or None),
     })
 
 
+@read_from_replica
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = comments_page(request, post.id)
+    return JsonResponse({
+        'html': render_to_string(
+            COMMENT_LIST_HTML, {'comments': comments}, request),
+        'next_cursor': comments.next_cursor,
+    })
+
+
+def search(request):
+    query = request.GET.get('q', '')
+    return render(request, SEARCH_HTML, {
+        'query': query,
+        'page_obj': search_page(
+            query, POSTS_ON_PAGE, request.GET.get('cursor')),
+        'extra_query': urlencode({'q': query}) + '&',
+    })
+
+
 @login_required
+@pin_to_primary
 def post_create(request):
     form = PostForm(request.POST or None, request.FILES or None)
     if not form.is_valid():
@@ -70,6 +143,7 @@ def post_create(request):
 
 
 @login_required
+@pin_to_primary
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if post.author != request.user:
@@ -89,6 +163,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@pin_to_primary
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -101,28 +176,26 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
-    return render(request, FOLLOW_INDEX_HTML, {
-        'page_obj': page_obj(
-            request,
-            Post.objects.filter(author__following__user=request.user))
-    })
+    if 'page' in request.GET:
+        page = page_obj(request, follow_posts(request.user))
+    else:
+        page = FeedPaginator(
+            request.user, Post.objects.for_listing(), POSTS_ON_PAGE
+        ).get_page(request.GET.get('cursor'))
+    return render(request, FOLLOW_INDEX_HTML, {'page_obj': page})
 
 
 @login_required
+@pin_to_primary
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if (request.user != author and not
-            Follow.objects.filter(user=request.user, author=author).exists()):
-        Follow.objects.create(user=request.user, author=author)
+    follow(request.user, get_object_or_404(User, username=username))
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@pin_to_primary
 def profile_unfollow(request, username):
-    follow = get_object_or_404(
-        Follow,
-        user=request.user,
-        author__username=username)
-    follow.delete()
+    unfollow(request.user, get_object_or_404(User, username=username))
     return redirect('posts:profile', username=username)
@@ -1,5 +1,9 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.core import mail
+from django.test import TestCase, Client, override_settings
+
+from core.models import OutboxEmail
+from core.tasks import run_pending
 
 User = get_user_model()
 
@@ -47,3 +51,20 @@ class URLTests(TestCase):
             with self.subTest(url=url):
                 response = self.guest_client.get(url, follow=True)
                 self.assertRedirects(response, redirection)
+
+    @override_settings(
+        EMAIL_BACKEND='core.mail.OutboxBackend',
+        OUTBOX_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_password_reset_mail_goes_through_outbox(self):
+        self.user.email = 'name@example.com'
+        # Сброс пароля шлёт письмо только при заданном пароле.
+        self.user.set_password('password')
+        self.user.save()
+        response = self.guest_client.post(
+            '/auth/password_reset/', {'email': 'name@example.com'})
+        self.assertRedirects(response, '/auth/password_reset/done/')
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+        run_pending()
+        self.assertEqual(mail.outbox[0].to, ['name@example.com'])
+        self.assertIn('/auth/reset/', mail.outbox[0].body)
@@ -0,0 +1,15 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+for example: ``uvicorn yatube.asgi:application``. Views still run
+synchronously, in a pool of ``ASGI_THREADS`` threads.
+"""
+
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+from core.asgi import get_asgi_application  # noqa: E402
+
+application = get_asgi_application()
@@ -22,11 +22,24 @@ ALLOWED_HOSTS = [
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма копятся в очереди (core.mail), воркер шлёт их через
+# OUTBOX_BACKEND пачками и не быстрее OUTBOX_RATE писем в секунду.
+EMAIL_BACKEND = 'core.mail.OutboxBackend'
+OUTBOX_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_RATE = 10
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_DIGEST_WINDOW = 15 * 60
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.SizeLimitUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -44,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +72,13 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Токен для сборщика метрик: Authorization: Bearer <токен>.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', default=100))
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG', default=os.path.join(BASE_DIR, 'slow_queries.log'))
+
 ROOT_URLCONF = 'yatube.urls'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
@@ -83,14 +104,93 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Очередь фоновых задач (core.tasks, команда run_tasks).
+TASK_PROCESSES = int(os.getenv('TASK_PROCESSES', default=1))
+TASK_THREADS = int(os.getenv('TASK_THREADS', default=4))
+TASK_POLL_INTERVAL = 1.0
+TASK_VISIBILITY_TIMEOUT = 300
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+
+# Потоки для представлений под ASGI (yatube.asgi): столько запросов
+# одновременно работают с базой, остальные ждут в цикле событий.
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', default=8))
+
+
+# DB_ENGINE=postgresql переключает на PostgreSQL (нужен psycopg2) с
+# постоянными соединениями; по умолчанию — SQLite с прагмами ниже.
+if os.getenv('DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', default='yatube'),
+            'USER': os.getenv('DB_USER', default='yatube'),
+            'PASSWORD': os.getenv('DB_PASSWORD', default=''),
+            'HOST': os.getenv('DB_HOST', default='localhost'),
+            'PORT': os.getenv('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv(
+                'DB_NAME', default=os.path.join(BASE_DIR, 'db.sqlite3')),
+        }
+    }
 
-DATABASES = {
+# DB_REPLICAS — через запятую адреса реплик (для SQLite — пути к файлам,
+# их обновляет команда sync_replicas). Страницы-читатели ходят на них.
+REPLICAS = []
+for number, location in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1):
+    REPLICAS.append(f'replica{number}')
+    DATABASES[REPLICAS[-1]] = {
+        **DATABASES['default'],
+        ('HOST' if os.getenv('DB_ENGINE') == 'postgresql' else 'NAME'):
+            location.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_APPS = {'posts'}
+REPLICA_PIN_SECONDS = 10
+
+# CACHE_BACKEND выбирает хранилище кеша. locmem живёт внутри процесса и
+# годится для разработки и тестов; file, memcached (нужен pylibmc) и
+# redis (нужен django-redis) общие для всех воркеров и переживают
+# перезапуск. CACHE_VERSION сбрасывает весь кеш разом.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'yatube'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             os.path.join(BASE_DIR, 'cache')),
+    'memcached': ('django.core.cache.backends.memcached.PyLibMCCache',
+                  '127.0.0.1:11211'),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND, CACHE_LOCATION = CACHE_BACKENDS[
+    os.getenv('CACHE_BACKEND', default='locmem')]
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', default=CACHE_LOCATION),
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', default='yatube'),
+        'VERSION': int(os.getenv('CACHE_VERSION', default=1)),
     }
 }
 
+# Выполняются на каждом новом соединении с SQLite: WAL пускает читателей
+# параллельно с писателем, busy_timeout ждёт блокировку вместо ошибки
+# «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
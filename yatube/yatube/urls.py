@@ -3,6 +3,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import metrics
+
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
@@ -12,6 +14,8 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('app_about.urls', namespace='app_about')),
+    path('metrics/', metrics, name='metrics'),
+    path('api/v1/', include('posts.api_urls', namespace='api_v1')),
     path('', include('posts.urls', namespace='posts')),
 ]
 